@@ -4,21 +4,33 @@ FastAPI endpoints for Patent NLP Project.
 Enhanced API that uses the centralized search service.
 """
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, validator, ValidationError
 from typing import List, Dict, Any, Optional
 import json
 import os
+import hashlib
+import re
 from pathlib import Path
 
 # Import search service
-from search_service import run_search, SearchRequest, format_results_for_api
-from search_utils import generate_snippet, analyze_query_log
+from search_service import run_search, is_cached, SearchRequest, format_results_for_api
+from search_utils import generate_snippet, analyze_query_log, flush_query_log
 from ollama_service import get_ollama_service
 
+try:
+    from optimized_search_service import encode_queries
+except ImportError:
+    encode_queries = None
+
 router = APIRouter()
 
+# Characters allowed in client-supplied file names
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
 
 class SearchRequestModel(BaseModel):
     query: str
@@ -232,10 +244,7 @@ async def summarize_endpoint(request: SummarizeRequestModel):
         doc_id = request.doc_id
         
         # If it's a chunk ID, get the base document ID
-        if '_chunk' in doc_id:
-            base_doc_id = doc_id.split('_chunk')[0]
-        else:
-            base_doc_id = doc_id
+        base_doc_id = doc_id.partition('_chunk')[0]
         
         # Try to load patent data by base document ID
         patent = load_patent_by_id(base_doc_id)
@@ -292,11 +301,8 @@ async def batch_search_endpoint(request: BatchSearchRequestModel):
             if not query or not query.strip():
                 raise HTTPException(status_code=400, detail=f"Query at index {i} cannot be empty")
         
-        results = []
-        
-        for query in request.queries:
-            # Create search request for each query
-            search_request = SearchRequest(
+        search_requests = [
+            SearchRequest(
                 query=query.strip(),
                 mode=request.mode,
                 top_k=request.top_k,
@@ -308,7 +314,22 @@ async def batch_search_endpoint(request: BatchSearchRequestModel):
                 include_metadata=request.include_metadata,
                 log_enabled=request.log_enabled
             )
-            
+            for query in request.queries
+        ]
+        
+        # Embed the cache misses in one batched pass; per-query searches reuse the vectors.
+        # On failure each search embeds its own query as before.
+        if encode_queries is not None and request.mode != "tfidf":
+            misses = [r.query for r in search_requests if not is_cached(r)]
+            if misses:
+                try:
+                    encode_queries(misses)
+                except Exception as e:
+                    print(f"Batch query encoding failed, embedding per query: {e}")
+        
+        results = []
+        
+        for search_request in search_requests:
             # Run search
             query_results, metadata = run_search(search_request)
             
@@ -370,12 +391,17 @@ async def compare_modes_endpoint(request: CompareModesRequestModel):
 
 
 @router.get("/logs/analyze")
-async def analyze_logs_endpoint(log_file: str = "query_log.jsonl"):
+async def analyze_logs_endpoint(request: Request, response: Response, log_file: str = "query_log.jsonl"):
     """
     Analyze query logs and return statistics.
+    Supports conditional requests: the ETag changes only when the log file does.
     """
     try:
+        # Only bare file names in the working directory (no path traversal)
+        log_file = _safe_filename(log_file)
         log_path = Path(log_file)
+        # Write out entries still queued by log_query, so the ETag describes the analyzed file
+        flush_query_log()
         if not log_path.exists():
             return {
                 "error": f"Log file {log_file} not found",
@@ -386,9 +412,16 @@ async def analyze_logs_endpoint(log_file: str = "query_log.jsonl"):
                 "most_common_queries": []
             }
         
+        # Skip the analysis entirely if the client's copy is still current
+        etag = _file_etag(log_path)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        
         # Analyze logs
         analysis = analyze_query_log(str(log_path))
         
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, max-age=10"
         return {
             "log_file": log_file,
             "total_queries": analysis.get("total_queries", 0),
@@ -422,6 +455,22 @@ async def health_check():
         raise HTTPException(status_code=503, detail=f"Service unhealthy: {str(e)}")
 
 
+def _safe_filename(name: str) -> str:
+    """
+    Reduce a client-supplied file name to a safe base name.
+    """
+    return _UNSAFE_FILENAME_CHARS.sub("_", Path(name).name)[:255]
+
+
+def _file_etag(path: Path) -> str:
+    """
+    Build an ETag from a file's path, modification time and size.
+    """
+    stat = path.stat()
+    key = f"{path.resolve()}:{stat.st_mtime_ns}:{stat.st_size}".encode("utf-8")
+    return '"' + hashlib.blake2b(key, digest_size=16).hexdigest() + '"'
+
+
 def load_patent_by_id(doc_id: str) -> Optional[Dict[str, Any]]:
     """
     Load patent data by document ID from grants or applications.
@@ -473,14 +522,14 @@ async def generate_draft_endpoint(request: DraftRequestModel):
         ollama_service = get_ollama_service()
         
         # Check if Ollama is available
-        if not ollama_service.is_available():
+        if not await run_in_threadpool(ollama_service.is_available):
             raise HTTPException(
                 status_code=503, 
                 detail="Ollama service is not available. Please install and start Ollama."
             )
         
-        # Generate draft
-        result = ollama_service.generate_patent_draft(
+        # Generate draft (the service runs blocking Ollama checks in a worker thread)
+        result = await ollama_service.agenerate_patent_draft(
             description=request.description,
             model_name=request.model,
             template_type=request.template_type
@@ -504,6 +553,34 @@ async def generate_draft_endpoint(request: DraftRequestModel):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@router.post("/generate_draft/stream")
+async def generate_draft_stream_endpoint(request: DraftRequestModel):
+    """
+    Stream a patent application draft as plain text while it is generated.
+    """
+    ollama_service = get_ollama_service()
+    
+    # Fail before the response starts; errors after the first chunk cannot change the status
+    if not await run_in_threadpool(ollama_service.is_available):
+        raise HTTPException(
+            status_code=503, 
+            detail="Ollama service is not available. Please install and start Ollama."
+        )
+    try:
+        ollama_service.validate_description(request.description)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(
+        ollama_service.agenerate_draft_stream(
+            description=request.description,
+            model_name=request.model,
+            template_type=request.template_type
+        ),
+        media_type="text/plain; charset=utf-8"
+    )
+
+
 @router.get("/ollama/health")
 async def ollama_health_check():
     """
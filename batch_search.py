@@ -30,7 +30,9 @@ def run_batch_search(queries: List[str], mode: str, top_k: int = 5,
                     semantic_weight: float = 0.7, rerank: bool = False) -> List[Dict[str, Any]]:
     #Run batch search on multiple queries
     results = []
-    metadata = load_patent_metadata()
+    # Only bare (doc_id, score) results need a metadata lookup; every mode here
+    # returns metadata with its results, so this is normally never loaded
+    metadata = None
     
     for i, query in enumerate(queries, 1):
         print(f"Processing query {i}/{len(queries)}: '{query}'")
@@ -61,7 +63,9 @@ def run_batch_search(queries: List[str], mode: str, top_k: int = 5,
             for rank, result in enumerate(search_results, 1):
                 if len(result) == 2:  # TF-IDF results
                     doc_id, score = result
-                    base_doc_id = doc_id.split('_chunk')[0] if '_chunk' in doc_id else doc_id
+                    base_doc_id = doc_id.partition('_chunk')[0]
+                    if metadata is None:
+                        metadata = load_patent_metadata()
                     meta = metadata.get(base_doc_id, {})
                     processed_results.append({
                         "rank": rank,
@@ -74,7 +78,7 @@ def run_batch_search(queries: List[str], mode: str, top_k: int = 5,
                     })
                 else:  # Semantic/Hybrid results
                     doc_id, score, meta = result
-                    base_doc_id = doc_id.split('_chunk')[0] if '_chunk' in doc_id else doc_id
+                    base_doc_id = doc_id.partition('_chunk')[0]
                     
                     # Generate snippet
                     snippet = ""
@@ -8,6 +8,7 @@ import yaml
 from pathlib import Path
 from typing import Dict, Any, Optional
 import os
+import threading
 
 
 class SearchConfig:
@@ -163,20 +164,25 @@ class SearchConfig:
 
 # Global configuration instance
 _config_instance = None
+_config_lock = threading.Lock()
 
 def get_config(config_path: str = "search_config.yaml") -> SearchConfig:
     """Get global configuration instance."""
     global _config_instance
     if _config_instance is None:
-        _config_instance = SearchConfig(config_path)
+        with _config_lock:
+            if _config_instance is None:
+                _config_instance = SearchConfig(config_path)
     return _config_instance
 
 
 def reload_config(config_path: str = "search_config.yaml") -> SearchConfig:
     """Reload configuration from file."""
     global _config_instance
-    _config_instance = SearchConfig(config_path)
-    return _config_instance
+    config = SearchConfig(config_path)
+    with _config_lock:
+        _config_instance = config
+    return config
 
 
 # Convenience functions
@@ -5,6 +5,7 @@ from typing import List, Tuple, Dict, Any
 from argparse import ArgumentParser
 from embed_tfidf import load_index as load_tfidf_index, search as search_tfidf
 from embed_semantic import load_semantic_index, search_semantic
+from search_utils import fuse_scores
 
 
 def search_hybrid(query: str, top_k: int = 5, alpha: float = 0.5, 
@@ -30,28 +31,13 @@ def search_hybrid(query: str, top_k: int = 5, alpha: float = 0.5,
     semantic_scores = {doc_id: score for doc_id, score, _ in semantic_results}
     semantic_metadata = {doc_id: meta for doc_id, _, meta in semantic_results}
     
-    # Combine scores
-    all_docs = set(tfidf_scores.keys()) | set(semantic_scores.keys())
-    combined_scores = {}
-    
-    for doc_id in all_docs:
-        tfidf_score = tfidf_scores.get(doc_id, 0.0)
-        semantic_score = semantic_scores.get(doc_id, 0.0)
-        
-        # Normalize scores to [0, 1] range
-        tfidf_norm = tfidf_score
-        semantic_norm = semantic_score
-        
-        # Combine with weighted average
-        combined_score = (1 - alpha) * tfidf_norm + alpha * semantic_norm
-        combined_scores[doc_id] = combined_score
-    
-    # Sort by combined score
-    sorted_docs = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
+    # Combine with weighted average (CombSUM), keeping the top k
+    sorted_docs = fuse_scores(tfidf_scores.items(), semantic_scores.items(),
+                              tfidf_weight=1 - alpha, semantic_weight=alpha, top_k=top_k)
     
     # Return top_k results with metadata
     results = []
-    for doc_id, score in sorted_docs[:top_k]:
+    for doc_id, score in sorted_docs:
         metadata = semantic_metadata.get(doc_id, {"title": "Unknown", "doc_id": doc_id})
         results.append((doc_id, score, metadata))
     
@@ -90,24 +76,14 @@ def search_hybrid_advanced(query: str, top_k: int = 5, tfidf_weight: float = 0.3
         semantic_range = semantic_max - semantic_min if semantic_max > semantic_min else 1.0
         semantic_scores = {doc_id: (score - semantic_min) / semantic_range for doc_id, score in semantic_scores.items()}
     
-    # Combine scores
-    all_docs = set(tfidf_scores.keys()) | set(semantic_scores.keys())
-    combined_scores = {}
-    
-    for doc_id in all_docs:
-        tfidf_score = tfidf_scores.get(doc_id, 0.0)
-        semantic_score = semantic_scores.get(doc_id, 0.0)
-        
-        # Weighted combination
-        combined_score = tfidf_weight * tfidf_score + semantic_weight * semantic_score
-        combined_scores[doc_id] = combined_score
-    
-    # Sort by combined score
-    sorted_docs = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
+    # Weighted combination (CombSUM), keeping the top k
+    sorted_docs = fuse_scores(tfidf_scores.items(), semantic_scores.items(),
+                              tfidf_weight=tfidf_weight, semantic_weight=semantic_weight,
+                              top_k=top_k)
     
     # Return top_k results with metadata
     results = []
-    for doc_id, score in sorted_docs[:top_k]:
+    for doc_id, score in sorted_docs:
         metadata = semantic_metadata.get(doc_id, {"title": "Unknown", "doc_id": doc_id})
         results.append((doc_id, score, metadata))
     
@@ -11,12 +11,23 @@ import faiss
 PROCESSED_DIR = Path("./data/processed")
 CHUNKS_FILE = PROCESSED_DIR / "chunks.jsonl"
 SEMANTIC_DIR = PROCESSED_DIR / "semantic"
-SEMANTIC_DIR.mkdir(parents=True, exist_ok=True)
 
 # Model configuration
 MODEL_NAME = "all-MiniLM-L6-v2"
 EMBEDDING_DIM = 384 
 
+# FAISS index configuration
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "sq8")
+INDEX_TYPE = "hnsw"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NLIST = 4096
+IVF_NPROBE = 16
+PQ_M = 48  # sub-quantizers; must divide the embedding dimension
+PQ_NBITS = 8
+PQ_MIN_TRAINING = 1 << PQ_NBITS  # one training vector per codebook centroid
+
 
 def load_texts_and_metadata(source_file: Path) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
     # Load texts and metadata from JSONL file.
@@ -52,30 +63,67 @@ def generate_embeddings(texts: List[str], model_name: str = MODEL_NAME) -> np.nd
     model = SentenceTransformer(model_name)
     
     print(f"Generating embeddings for {len(texts)} texts")
-    embeddings = model.encode(texts, show_progress_bar=True, batch_size=32)
-    
     # Normalize embeddings for cosine similarity
-    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = model.encode(texts, show_progress_bar=True, batch_size=32, normalize_embeddings=True)
     
     return embeddings
 
 
-def build_faiss_index(embeddings: np.ndarray) -> faiss.Index:
-    # Build FAISS index for efficient similarity search
-    dimension = embeddings.shape[1]
-    
-    # Create IndexFlatIP for inner product (cosine similarity with normalized vectors)
-    index = faiss.IndexFlatIP(dimension)
-    
+def build_faiss_index(embeddings: np.ndarray, index_type: str = INDEX_TYPE) -> faiss.Index:
+    # Build FAISS index for efficient similarity search.
+    # Embeddings are normalized, so inner product equals cosine similarity.
+    #   flat  - exact brute-force scan (IndexFlatIP)
+    #   hnsw  - graph index with ~log N search (IndexHNSWFlat)
+    #   ivfpq - inverted lists + product quantization for large corpora (IndexIVFPQ)
+    #   sq8   - exact scan over 8-bit scalar-quantized vectors, 4x less memory (IndexScalarQuantizer)
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    num_vectors, dimension = embeddings.shape
+
+    # k-means training needs at least one vector per centroid: 2^8 per PQ codebook
+    # (and nlist for the coarse quantizer, which is capped below num_vectors)
+    if index_type == "ivfpq" and num_vectors < PQ_MIN_TRAINING:
+        print(f"Warning: ivfpq needs at least {PQ_MIN_TRAINING} vectors to train, got {num_vectors}; "
+              f"building an hnsw index instead")
+        index_type = "hnsw"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivfpq":
+        # Keep ~39+ training points per list, as FAISS recommends
+        nlist = max(1, min(IVF_NLIST, num_vectors // 39))
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        index.nprobe = IVF_NPROBE
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
     # Add embeddings to index
-    index.add(embeddings.astype('float32'))
-    
+    index.add(embeddings)
+
     return index
 
 
+def search_params(index: faiss.Index, top_k: int):
+    # Per-call search parameters for approximate indices (None for exact ones).
+    # Passed to index.search instead of set on the index, which is shared by concurrent queries.
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(efSearch=max(HNSW_EF_SEARCH, top_k * 4))
+    if hasattr(index, "nprobe"):
+        return faiss.SearchParametersIVF(nprobe=max(index.nprobe, IVF_NPROBE))
+    return None
+
+
 def save_semantic_index(index: faiss.Index, ids: List[str], metadata: List[Dict], model_name: str) -> None:
 
     # Save FAISS index
+    SEMANTIC_DIR.mkdir(parents=True, exist_ok=True)
     faiss.write_index(index, str(SEMANTIC_DIR / "faiss_index.bin"))
     
     # Save IDs and metadata
@@ -118,12 +166,12 @@ def search_semantic(query: str, top_k: int = 5, rerank: bool = False,
     
     # Load model and encode query
     model = SentenceTransformer(model_name)
-    query_embedding = model.encode([query])
-    query_embedding = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
+    query_embedding = model.encode([query], normalize_embeddings=True)
     
     # Search FAISS index (get more results if re-ranking)
     search_k = top_k * 2 if rerank else top_k
-    scores, indices = index.search(query_embedding.astype('float32'), search_k)
+    scores, indices = index.search(query_embedding.astype('float32'), search_k,
+                                   params=search_params(index, search_k))
     
     # Load patent metadata for enrichment
     from search_utils import load_patent_metadata, get_chunk_text, rerank_results
@@ -132,12 +180,12 @@ def search_semantic(query: str, top_k: int = 5, rerank: bool = False,
     # Get initial results with enriched metadata
     results = []
     for score, idx in zip(scores[0], indices[0]):
-        if idx < len(ids):  # Valid index
+        if 0 <= idx < len(ids):  # Valid index (approximate indices pad with -1)
             doc_id = ids[idx]
             chunk_meta = metadata[idx]
             
             # Get base document ID
-            base_doc_id = doc_id.split('_chunk')[0] if '_chunk' in doc_id else doc_id
+            base_doc_id = doc_id.partition('_chunk')[0]
             
             # Get patent metadata
             patent_meta = patent_metadata.get(base_doc_id, {})
@@ -168,7 +216,7 @@ def search_semantic(query: str, top_k: int = 5, rerank: bool = False,
         # Re-rank based on keyword overlap
         reranked_scores = rerank_results(
             [(doc_id, score) for doc_id, score, _ in rerank_data],
-            query, keyword_weight, semantic_weight
+            query, keyword_weight, semantic_weight, top_k=top_k
         )
         
         # Rebuild results with re-ranked scores
@@ -179,14 +227,15 @@ def search_semantic(query: str, top_k: int = 5, rerank: bool = False,
             original_meta = next((meta for d_id, _, meta in results if d_id == doc_id), {})
             reranked_results.append((doc_id, new_score, original_meta))
         
-        results = reranked_results[:top_k]
+        results = reranked_results
     else:
         results = results[:top_k]
     
     return results
 
 
-def build_semantic_index(source_file: Path = CHUNKS_FILE, model_name: str = MODEL_NAME) -> None:
+def build_semantic_index(source_file: Path = CHUNKS_FILE, model_name: str = MODEL_NAME,
+                         index_type: str = INDEX_TYPE) -> None:
     # Build semantic index from source file
     print(f"Building semantic index from {source_file}")
     
@@ -198,8 +247,8 @@ def build_semantic_index(source_file: Path = CHUNKS_FILE, model_name: str = MODE
     embeddings = generate_embeddings(texts, model_name)
     
     # Build FAISS index
-    print("Building FAISS index")
-    index = build_faiss_index(embeddings)
+    print(f"Building FAISS index ({index_type})")
+    index = build_faiss_index(embeddings, index_type)
     
     # Save everything
     save_semantic_index(index, ids, metadata, model_name)
@@ -220,8 +269,7 @@ def add_documents_to_index(new_texts: List[str], new_metadata: List[Dict], model
     
     # Generate embeddings for new documents
     model = SentenceTransformer(model_name)
-    new_embeddings = model.encode(new_texts, show_progress_bar=True, batch_size=32)
-    new_embeddings = new_embeddings / np.linalg.norm(new_embeddings, axis=1, keepdims=True)
+    new_embeddings = model.encode(new_texts, show_progress_bar=True, batch_size=32, normalize_embeddings=True)
     
     # Add to FAISS index
     index.add(new_embeddings.astype('float32'))
@@ -242,12 +290,13 @@ if __name__ == "__main__":
     parser.add_argument("action", choices=["build", "search", "add"], help="Build index, run search, or add documents")
     parser.add_argument("--source", default=str(CHUNKS_FILE), help="Path to JSONL with 'text' and ids")
     parser.add_argument("--model", default=MODEL_NAME, help="Sentence transformer model name")
+    parser.add_argument("--index_type", choices=INDEX_TYPES, default=INDEX_TYPE, help="FAISS index type")
     parser.add_argument("--query", type=str, default="", help="Query text for search")
     parser.add_argument("--top_k", type=int, default=5, help="Number of results to return")
     args = parser.parse_args()
 
     if args.action == "build":
-        build_semantic_index(Path(args.source), args.model)
+        build_semantic_index(Path(args.source), args.model, args.index_type)
     elif args.action == "add":
         # For adding documents
         print("Add functionality requires programmatic usage")
@@ -1,7 +1,7 @@
 import json
 from pathlib import Path
 from argparse import ArgumentParser
-from typing import List, Tuple, Dict, Any
+from typing import Iterable, Iterator, List, Tuple, Dict, Any
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
@@ -9,12 +9,11 @@ from sklearn.metrics.pairwise import cosine_similarity
 PROCESSED_DIR = Path("./data/processed")
 CHUNKS_FILE = PROCESSED_DIR / "chunks.jsonl"
 TFIDF_DIR = PROCESSED_DIR / "tfidf"
-TFIDF_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def load_texts(source_file: Path) -> Tuple[List[str], List[str]]:
-    texts: List[str] = []
-    ids: List[str] = []
+def iter_texts(source_file: Path, ids: List[str]) -> Iterator[str]:
+    # Yield each non-empty text, appending its id to ids as it goes,
+    # so the TF-IDF fit can stream the file instead of holding every text
     with open(source_file, "r", encoding="utf-8") as f:
         for line in f:
             item = json.loads(line)
@@ -22,12 +21,18 @@ def load_texts(source_file: Path) -> Tuple[List[str], List[str]]:
             if not text:
                 continue
             item_id = item.get("chunk_id") or item.get("doc_id")
-            texts.append(text)
             ids.append(str(item_id))
+            yield text
+
+
+def load_texts(source_file: Path) -> Tuple[List[str], List[str]]:
+    ids: List[str] = []
+    texts = list(iter_texts(source_file, ids))
     return ids, texts
 
 
-def build_tfidf(ids: List[str], texts: List[str], max_features: int = 100000) -> Tuple[TfidfVectorizer, any]:
+def build_tfidf(ids: List[str], texts: Iterable[str], max_features: int = 100000) -> Tuple[TfidfVectorizer, any]:
+    # texts may be a one-shot iterator; fit_transform makes a single pass over it
     vectorizer = TfidfVectorizer(max_features=max_features)
     matrix = vectorizer.fit_transform(texts)
     return vectorizer, matrix
@@ -35,6 +40,7 @@ def build_tfidf(ids: List[str], texts: List[str], max_features: int = 100000) ->
 
 def save_index(vectorizer: TfidfVectorizer, matrix, ids: List[str]) -> None:
     import pickle
+    TFIDF_DIR.mkdir(parents=True, exist_ok=True)
     with open(TFIDF_DIR / "vectorizer.pkl", "wb") as f:
         pickle.dump(vectorizer, f)
     with open(TFIDF_DIR / "matrix.npz", "wb") as f:
@@ -77,7 +83,7 @@ def search_with_metadata(query: str, top_k: int = 5) -> List[Tuple[str, float, D
     enriched_results = []
     for doc_id, score in results:
         # Get base document metadata
-        base_doc_id = doc_id.split('_chunk')[0] if '_chunk' in doc_id else doc_id
+        base_doc_id = doc_id.partition('_chunk')[0]
         base_meta = metadata.get(base_doc_id, {})
         
         # Get chunk text
@@ -108,10 +114,15 @@ if __name__ == "__main__":
 
     if args.action == "build":
         src = Path(args.source)
-        ids, texts = load_texts(src)
-        vectorizer, matrix = build_tfidf(ids, texts, max_features=args.max_features)
+        ids: List[str] = []
+        vectorizer, matrix = build_tfidf(ids, iter_texts(src, ids), max_features=args.max_features)
         save_index(vectorizer, matrix, ids)
         print(f"TF-IDF index built with {len(ids)} items and saved to {TFIDF_DIR}")
+        # Keyword token sets for reranking; search_utils keys them to chunks.jsonl
+        if src.resolve() == CHUNKS_FILE.resolve():
+            from search_utils import build_token_index
+            build_token_index()
+            print("Rerank token index built")
     else:
         if not args.query:
             raise SystemExit("--query is required for search")
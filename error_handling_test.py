@@ -2,23 +2,87 @@
 """
 Comprehensive error handling test for Patent NLP API.
 Tests all edge cases and error conditions.
+
+Run as a script for the summary report (needs only requests). The per-case
+validation checks are also parametrized in test_error_handling.py so they can
+run in parallel under pytest:
+    pytest test_error_handling.py -n auto
 """
 
+import asyncio
 import requests
 import json
+import threading
 
 API_BASE = "http://127.0.0.1:8000/api/v1"
 
+# Use orjson for request/response bodies when available
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+    _loads = json.loads
+
+# One HTTP session per thread (keeps connections alive across tests;
+# requests.Session is not safe to share between executor workers)
+_local = threading.local()
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+def _encode(payload):
+    """Serialize a payload once so repeated requests can reuse the bytes."""
+    return _dumps(payload)
+
+# Static request bodies, serialized once at import
+EMPTY_QUERY_BODY = _encode({"query": "", "mode": "semantic", "top_k": 5})
+WHITESPACE_QUERY_BODY = _encode({"query": "   ", "mode": "semantic", "top_k": 5})
+INVALID_MODE_BODY = _encode({"query": "test", "mode": "invalid_mode", "top_k": 5})
+INVALID_TOP_K_BODIES = tuple(
+    (top_k, _encode({"query": "test", "mode": "semantic", "top_k": top_k}), expected)
+    for top_k, expected in (
+        (-1, (400, 422)),
+        (0, (400, 422)),
+        (101, (400, 422)),
+        ("invalid", (422,)),  # Pydantic validation error
+    )
+)
+INVALID_ALPHA_BODIES = tuple(
+    (alpha, _encode({"query": "test", "mode": "hybrid", "alpha": alpha}), expected)
+    for alpha, expected in (
+        (-0.1, (400, 422)),
+        (1.1, (400, 422)),
+        ("invalid", (422,)),
+    )
+)
+MISSING_FIELDS_BODIES = (
+    (_encode({}), 422),  # Missing query
+    (_encode({"mode": "semantic"}), 422),  # Missing query
+    (_encode({"query": "test"}), 200),  # Should work with defaults
+)
+MISSING_FIELDS_IDS = ("empty", "mode_only", "query_only")
+EMPTY_BATCH_BODY = _encode({"queries": [], "mode": "semantic", "top_k": 5})
+BATCH_WITH_EMPTY_QUERY_BODY = _encode({"queries": ["test", "", "another test"], "mode": "semantic", "top_k": 5})
+NONEXISTENT_DOC_BODY = _encode({"doc_id": "NONEXISTENT_DOC_12345", "max_length": 200})
+INVALID_MAX_LENGTH_BODY = _encode({"doc_id": "US12417505B2", "max_length": -1})
+
+def _session():
+    """Return the calling thread's HTTP session, creating it on first use."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+def _post(endpoint, body, timeout=10):
+    """POST a pre-serialized JSON body."""
+    return _session().post(f"{API_BASE}/{endpoint}", data=body, headers=JSON_HEADERS, timeout=timeout)
+
 def test_empty_query():
     """Test empty query handling."""
     print("Testing empty query...")
     try:
-        payload = {
-            "query": "",
-            "mode": "semantic",
-            "top_k": 5
-        }
-        response = requests.post(f"{API_BASE}/search", json=payload, timeout=10)
+        response = _post("search", EMPTY_QUERY_BODY)
         if response.status_code in [400, 422]:
             print("Empty query: Properly rejected")
             return True
@@ -34,12 +98,7 @@ def test_whitespace_query():
     """Test whitespace-only query handling."""
     print("Testing whitespace query...")
     try:
-        payload = {
-            "query": "   ",
-            "mode": "semantic",
-            "top_k": 5
-        }
-        response = requests.post(f"{API_BASE}/search", json=payload, timeout=10)
+        response = _post("search", WHITESPACE_QUERY_BODY)
         if response.status_code in [400, 422]:
             print("Whitespace query: Properly rejected")
             return True
@@ -54,12 +113,7 @@ def test_invalid_mode():
     """Test invalid search mode handling."""
     print("Testing invalid mode...")
     try:
-        payload = {
-            "query": "test",
-            "mode": "invalid_mode",
-            "top_k": 5
-        }
-        response = requests.post(f"{API_BASE}/search", json=payload, timeout=10)
+        response = _post("search", INVALID_MODE_BODY)
         if response.status_code in [400, 422]:
             print("Invalid mode: Properly rejected")
             return True
@@ -70,94 +124,17 @@ def test_invalid_mode():
         print(f"Invalid mode: {e}")
         return False
 
-def test_invalid_top_k():
-    """Test invalid top_k values."""
-    print("Testing invalid top_k...")
-    
-    test_cases = [
-        {"top_k": -1, "expected": [400, 422]},
-        {"top_k": 0, "expected": [400, 422]},
-        {"top_k": 101, "expected": [400, 422]},
-        {"top_k": "invalid", "expected": [422]},  # Pydantic validation error
-    ]
-    
-    results = []
-    for case in test_cases:
-        try:
-            payload = {
-                "query": "test",
-                "mode": "semantic",
-                "top_k": case["top_k"]
-            }
-            response = requests.post(f"{API_BASE}/search", json=payload, timeout=10)
-            if response.status_code in case["expected"]:
-                print(f"top_k={case['top_k']}: Properly rejected with {response.status_code}")
-                results.append(True)
-            else:
-                print(f"top_k={case['top_k']}: Expected {case['expected']}, got {response.status_code}")
-                results.append(False)
-        except Exception as e:
-            print(f"top_k={case['top_k']}: {e}")
-            results.append(False)
-    
-    return all(results)
+def check_top_k_case(top_k, body, expected):
+    """Each invalid top_k value is rejected."""
+    assert _post("search", body).status_code in expected
 
-def test_invalid_alpha():
-    """Test invalid alpha values for hybrid search."""
-    print("Testing invalid alpha...")
-    
-    test_cases = [
-        {"alpha": -0.1, "expected": [400, 422]},
-        {"alpha": 1.1, "expected": [400, 422]},
-        {"alpha": "invalid", "expected": [422]},
-    ]
-    
-    results = []
-    for case in test_cases:
-        try:
-            payload = {
-                "query": "test",
-                "mode": "hybrid",
-                "alpha": case["alpha"]
-            }
-            response = requests.post(f"{API_BASE}/search", json=payload, timeout=10)
-            if response.status_code in case["expected"]:
-                print(f"alpha={case['alpha']}: Properly rejected with {response.status_code}")
-                results.append(True)
-            else:
-                print(f"alpha={case['alpha']}: Expected {case['expected']}, got {response.status_code}")
-                results.append(False)
-        except Exception as e:
-            print(f"alpha={case['alpha']}: {e}")
-            results.append(False)
-    
-    return all(results)
+def check_alpha_case(alpha, body, expected):
+    """Each invalid alpha value is rejected."""
+    assert _post("search", body).status_code in expected
 
-def test_missing_required_fields():
-    """Test missing required fields."""
-    print("Testing missing required fields...")
-    
-    test_cases = [
-        {"payload": {}, "expected": 422},  # Missing query
-        {"payload": {"mode": "semantic"}, "expected": 422},  # Missing query
-        {"payload": {"query": "test"}, "expected": 200},  # Should work with defaults
-    ]
-    
-    results = []
-    for i, case in enumerate(test_cases):
-        try:
-            response = requests.post(f"{API_BASE}/search", json=case["payload"], timeout=10)
-            if response.status_code == case["expected"]:
-                print(f"Missing fields test {i+1}: Got expected {case['expected']}")
-                results.append(True)
-            else:
-                print(f"Missing fields test {i+1}: Expected {case['expected']}, got {response.status_code}")
-                results.append(False)
-        except Exception as e:
-            print(f"Missing fields test {i+1}: {e}")
-            results.append(False)
-    
-    return all(results)
+def check_missing_fields_case(body, expected):
+    """Missing required fields are rejected; defaults fill the rest."""
+    assert _post("search", body).status_code == expected
 
 def test_batch_search_errors():
     """Test batch search error handling."""
@@ -165,12 +142,7 @@ def test_batch_search_errors():
     
     # Test empty queries list
     try:
-        payload = {
-            "queries": [],
-            "mode": "semantic",
-            "top_k": 5
-        }
-        response = requests.post(f"{API_BASE}/batch_search", json=payload, timeout=10)
+        response = _post("batch_search", EMPTY_BATCH_BODY)
         if response.status_code in [400, 422]:
             print("Empty queries list: Properly rejected")
         else:
@@ -180,12 +152,7 @@ def test_batch_search_errors():
     
     # Test queries with empty strings
     try:
-        payload = {
-            "queries": ["test", "", "another test"],
-            "mode": "semantic",
-            "top_k": 5
-        }
-        response = requests.post(f"{API_BASE}/batch_search", json=payload, timeout=10)
+        response = _post("batch_search", BATCH_WITH_EMPTY_QUERY_BODY)
         if response.status_code in [400, 422]:
             print("Batch with empty query: Properly rejected")
             return True
@@ -202,11 +169,7 @@ def test_summarize_errors():
     
     # Test non-existent document
     try:
-        payload = {
-            "doc_id": "NONEXISTENT_DOC_12345",
-            "max_length": 200
-        }
-        response = requests.post(f"{API_BASE}/summarize", json=payload, timeout=10)
+        response = _post("summarize", NONEXISTENT_DOC_BODY)
         if response.status_code == 404:
             print("Non-existent doc: Properly returned 404")
         else:
@@ -216,11 +179,7 @@ def test_summarize_errors():
     
     # Test invalid max_length
     try:
-        payload = {
-            "doc_id": "US12417505B2",
-            "max_length": -1
-        }
-        response = requests.post(f"{API_BASE}/summarize", json=payload, timeout=10)
+        response = _post("summarize", INVALID_MAX_LENGTH_BODY)
         if response.status_code == 422:
             print("Invalid max_length: Properly rejected with 422")
             return True
@@ -235,12 +194,7 @@ def test_malformed_json():
     """Test malformed JSON handling."""
     print("Testing malformed JSON...")
     try:
-        response = requests.post(
-            f"{API_BASE}/search",
-            data="invalid json",
-            headers={"Content-Type": "application/json"},
-            timeout=10
-        )
+        response = _post("search", b"invalid json")
         if response.status_code == 422:
             print("Malformed JSON: Properly rejected with 422")
             return True
@@ -263,7 +217,7 @@ def test_large_requests():
             "mode": "semantic",
             "top_k": 5
         }
-        response = requests.post(f"{API_BASE}/search", json=payload, timeout=30)
+        response = _post("search", _dumps(payload), timeout=30)
         if response.status_code == 200:
             print("Large query: Handled successfully")
         else:
@@ -271,24 +225,74 @@ def test_large_requests():
     except Exception as e:
         print(f"Large query: {e}")
     
+    large_queries = [f"query {i}" for i in range(100)]  # 100 queries
+    
     # Test large batch
     try:
-        large_queries = [f"query {i}" for i in range(100)]  # 100 queries
         payload = {
             "queries": large_queries,
             "mode": "semantic",
             "top_k": 3
         }
-        response = requests.post(f"{API_BASE}/batch_search", json=payload, timeout=60)
+        response = _post("batch_search", _dumps(payload), timeout=60)
         if response.status_code == 200:
             print("Large batch: Handled successfully")
-            return True
         else:
             print(f"Large batch: Got {response.status_code}")
             return False
     except Exception as e:
         print(f"Large batch: {e}")
         return False
+    
+    # Test the same queries as concurrent smaller batches
+    try:
+        status_codes = asyncio.run(_post_batches(large_queries, batch_size=16, max_concurrency=8))
+        if all(code == 200 for code in status_codes):
+            print(f"Concurrent batches: Handled successfully ({len(status_codes)} batch requests)")
+            return True
+        else:
+            print(f"Concurrent batches: Got {status_codes}")
+            return False
+    except Exception as e:
+        print(f"Concurrent batches: {e}")
+        return False
+
+async def _post_batches(queries, batch_size=16, max_concurrency=8):
+    """Send queries to /batch_search in concurrent groups, bounded by a semaphore."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+    
+    async def post_batch(batch):
+        payload = {
+            "queries": batch,
+            "mode": "semantic",
+            "top_k": 3
+        }
+        async with semaphore:
+            response = await loop.run_in_executor(
+                None,
+                lambda: _post("batch_search", _dumps(payload), timeout=60)
+            )
+        return response.status_code
+    
+    batches = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+    return await asyncio.gather(*[post_batch(batch) for batch in batches])
+
+def _as_check(name, case, *args):
+    """Wrap a parametrized case as a pass/fail check for the script runner."""
+    def check():
+        print(f"Testing {name}...")
+        try:
+            case(*args)
+            print(f"{name}: Got expected status")
+            return True
+        except AssertionError:
+            print(f"{name}: Unexpected status")
+            return False
+        except Exception as e:
+            print(f"{name}: {e}")
+            return False
+    return check
 
 def main():
     """Run all error handling tests."""
@@ -299,9 +303,10 @@ def main():
         test_empty_query,
         test_whitespace_query,
         test_invalid_mode,
-        test_invalid_top_k,
-        test_invalid_alpha,
-        test_missing_required_fields,
+        *[_as_check(f"top_k={case[0]}", check_top_k_case, *case) for case in INVALID_TOP_K_BODIES],
+        *[_as_check(f"alpha={case[0]}", check_alpha_case, *case) for case in INVALID_ALPHA_BODIES],
+        *[_as_check(f"missing fields ({case_id})", check_missing_fields_case, *case)
+          for case_id, case in zip(MISSING_FIELDS_IDS, MISSING_FIELDS_BODIES)],
         test_batch_search_errors,
         test_summarize_errors,
         test_malformed_json,
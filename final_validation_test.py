@@ -7,17 +7,84 @@ Tests all endpoints, performance, and edge cases.
 import requests
 import json
 import time
-import statistics
+import math
+from functools import lru_cache
+from pathlib import Path
 
 API_BASE = "http://127.0.0.1:8000/api/v1"
 
+# Use orjson for request/response bodies when available
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+    _loads = json.loads
+
+SESSION = requests.Session()
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+def _post_json(endpoint, payload, timeout):
+    """POST a payload serialized with the fast JSON codec."""
+    return SESSION.post(f"{API_BASE}/{endpoint}", data=_dumps(payload), headers=JSON_HEADERS, timeout=timeout)
+
+# doc_ids discovered by earlier runs, so repeat runs can skip the lookup search
+DOC_ID_CACHE_FILE = Path(".pytest_cache") / "doc_ids.json"
+
+def _load_doc_id_cache():
+    try:
+        with open(DOC_ID_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+_doc_id_cache = _load_doc_id_cache()
+
+def _save_doc_id_cache():
+    try:
+        DOC_ID_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(DOC_ID_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(_doc_id_cache, f)
+    except OSError:
+        pass
+
+@lru_cache(maxsize=32)
+def get_doc_id_for(query):
+    """Return the top semantic hit's doc_id for a query (None if no results)."""
+    if query in _doc_id_cache:
+        return _doc_id_cache[query]
+    
+    search_payload = {
+        "query": query,
+        "mode": "semantic",
+        "top_k": 3
+    }
+    search_response = _post_json("search", search_payload, timeout=20)
+    search_response.raise_for_status()
+    search_results = _loads(search_response.content)['results']
+    if not search_results:
+        return None
+    
+    doc_id = search_results[0]['doc_id']
+    _doc_id_cache[query] = doc_id
+    _save_doc_id_cache()
+    return doc_id
+
+def _forget_doc_id(query):
+    """Drop a (possibly stale) cached doc_id so the next lookup searches again."""
+    get_doc_id_for.cache_clear()
+    if _doc_id_cache.pop(query, None) is not None:
+        _save_doc_id_cache()
+
 def test_health():
     """Test health endpoint."""
     print("Testing Health Endpoint...")
     try:
-        response = requests.get(f"{API_BASE}/health", timeout=5)
+        response = SESSION.get(f"{API_BASE}/health", timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = _loads(response.content)
             print(f"Health: {data['status']} - Version {data['version']}")
             return True
         else:
@@ -46,11 +113,11 @@ def test_all_search_modes():
             }
             
             start_time = time.time()
-            response = requests.post(f"{API_BASE}/search", json=payload, timeout=30)
+            response = _post_json("search", payload, timeout=30)
             end_time = time.time()
             
             if response.status_code == 200:
-                data = response.json()
+                data = _loads(response.content)
                 results[mode] = {
                     "success": True,
                     "response_time": end_time - start_time,
@@ -81,11 +148,11 @@ def test_batch_search():
         }
         
         start_time = time.time()
-        response = requests.post(f"{API_BASE}/batch_search", json=payload, timeout=45)
+        response = _post_json("batch_search", payload, timeout=45)
         end_time = time.time()
         
         if response.status_code == 200:
-            data = response.json()
+            data = _loads(response.content)
             print(f"Batch: {data['total_queries']} queries in {end_time - start_time:.3f}s")
             
             # Verify all queries were processed
@@ -111,10 +178,10 @@ def test_compare_modes():
             "top_k": 3
         }
         
-        response = requests.post(f"{API_BASE}/compare_modes", json=payload, timeout=60)
+        response = _post_json("compare_modes", payload, timeout=60)
         
         if response.status_code == 200:
-            data = response.json()
+            data = _loads(response.content)
             modes = list(data['results'].keys())
             expected_modes = ["tfidf", "semantic", "hybrid", "hybrid-advanced"]
             
@@ -142,39 +209,42 @@ def test_compare_modes():
 def test_summarize():
     """Test summarization functionality."""
     print("\nTesting Summarize...")
+    query = "machine learning"
     try:
-        # Get a doc_id from search first
-        search_payload = {
-            "query": "machine learning",
-            "mode": "semantic",
-            "top_k": 3
+        # Get a doc_id from search first (memoized across runs)
+        try:
+            doc_id = get_doc_id_for(query)
+        except requests.RequestException:
+            print("Summarize: Could not get doc_id from search")
+            return False
+        
+        if doc_id is None:
+            print("Summarize: No search results to test with")
+            return False
+        
+        payload = {
+            "doc_id": doc_id,
+            "max_length": 200
         }
-        search_response = requests.post(f"{API_BASE}/search", json=search_payload, timeout=20)
+        response = _post_json("summarize", payload, timeout=20)
         
-        if search_response.status_code == 200:
-            search_data = search_response.json()
-            if search_data['results']:
-                doc_id = search_data['results'][0]['doc_id']
-                
-                payload = {
-                    "doc_id": doc_id,
-                    "max_length": 200
-                }
-                response = requests.post(f"{API_BASE}/summarize", json=payload, timeout=20)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    print(f"Summarize: {len(data['summary'])} chars for {data['doc_id']}")
-                    print(f"  Title: {data.get('title', 'No title')}")
-                    return True
-                else:
-                    print(f"Summarize: Status {response.status_code}")
-                    return False
-            else:
-                print("Summarize: No search results to test with")
+        if response.status_code == 404:
+            # Cached doc_id may predate an index rebuild; look it up again once
+            _forget_doc_id(query)
+            doc_id = get_doc_id_for(query)
+            if doc_id is None:
+                print("Summarize: No search results after index rebuild")
                 return False
+            payload["doc_id"] = doc_id
+            response = _post_json("summarize", payload, timeout=20)
+        
+        if response.status_code == 200:
+            data = _loads(response.content)
+            print(f"Summarize: {len(data['summary'])} chars for {data['doc_id']}")
+            print(f"  Title: {data.get('title', 'No title')}")
+            return True
         else:
-            print("Summarize: Could not get doc_id from search")
+            print(f"Summarize: Status {response.status_code}")
             return False
     except Exception as e:
         print(f"Summarize: {e}")
@@ -184,9 +254,9 @@ def test_log_analysis():
     """Test log analysis."""
     print("\nTesting Log Analysis...")
     try:
-        response = requests.get(f"{API_BASE}/logs/analyze", timeout=10)
+        response = SESSION.get(f"{API_BASE}/logs/analyze", timeout=10)
         if response.status_code == 200:
-            data = response.json()
+            data = _loads(response.content)
             print(f"Logs: {data['total_queries']} total queries analyzed")
             print(f"  Unique queries: {data['unique_queries']}")
             print(f"  Mode usage: {data['mode_usage']}")
@@ -233,7 +303,7 @@ def test_validation():
     passed = 0
     for test in validation_tests:
         try:
-            response = requests.post(f"{API_BASE}/search", json=test["payload"], timeout=10)
+            response = _post_json("search", test["payload"], timeout=10)
             if response.status_code == test["expected_status"]:
                 print(f"{test['name']}: Properly rejected with {test['expected_status']}")
                 passed += 1
@@ -255,7 +325,7 @@ def test_performance():
             "top_k": 5
         }
         start_time = time.time()
-        response = requests.post(f"{API_BASE}/search", json=payload, timeout=30)
+        response = _post_json("search", payload, timeout=30)
         end_time = time.time()
         return {
             "status_code": response.status_code,
@@ -276,9 +346,17 @@ def test_performance():
         time.sleep(0.5)  # Small delay between requests
     
     if response_times:
-        avg_time = statistics.mean(response_times)
-        max_time = max(response_times)
-        min_time = min(response_times)
+        # Single pass over the samples for total, min and max
+        total_time = 0.0
+        min_time = math.inf
+        max_time = -math.inf
+        for t in response_times:
+            total_time += t
+            if t < min_time:
+                min_time = t
+            if t > max_time:
+                max_time = t
+        avg_time = total_time / len(response_times)
         
         print(f"Performance: {successful_requests}/5 successful requests")
         print(f"  Average response time: {avg_time:.3f}s")
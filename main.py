@@ -3,10 +3,19 @@
 FastAPI main application for Patent NLP Project.
 """
 
+import os
+import threading
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api_endpoints import router, setup_validation_error_handler
 
+# Use orjson for response serialization when available (much faster than stdlib json)
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponseClass
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultResponseClass
+
 # Warm up caches for better performance
 try:
     from optimized_search_service import warm_up_caches
@@ -21,18 +30,60 @@ app = FastAPI(
     description="Advanced patent search and analysis API with semantic search, re-ranking, and summarization",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=DefaultResponseClass
 )
 
 # Add CORS middleware
+# Explicit origins (comma-separated CORS_ORIGINS env var) let browsers cache preflights
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
+# Streaming responses bypass compression: the compressor buffers output until it has
+# a full block, which would hold back draft text the client should see as it arrives
+UNCOMPRESSED_PATHS = frozenset({"/api/v1/generate_draft/stream"})
+
+class SelectiveCompressionMiddleware:
+    """Apply a compression middleware to every route except UNCOMPRESSED_PATHS."""
+    
+    def __init__(self, app, compressor, **options):
+        self.app = app
+        self.compressed_app = compressor(app, **options)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in UNCOMPRESSED_PATHS:
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed_app(scope, receive, send)
+
+# Compress larger JSON responses (Brotli when available, gzip otherwise)
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(SelectiveCompressionMiddleware, compressor=BrotliMiddleware,
+                       minimum_size=1024, quality=4)
+except ImportError:
+    from fastapi.middleware.gzip import GZipMiddleware
+    app.add_middleware(SelectiveCompressionMiddleware, compressor=GZipMiddleware,
+                       minimum_size=1024, compresslevel=5)
+
+# Load the default Ollama model in the background so the first draft request skips model load
+@app.on_event("startup")
+async def warm_up_ollama():
+    from ollama_service import warm_up_ollama_service
+    threading.Thread(target=warm_up_ollama_service, daemon=True).start()
+
 # Setup validation error handler
 setup_validation_error_handler(app)
 
@@ -58,4 +109,27 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    # uvloop + httptools when installed (uvicorn[standard]); uvloop is not available on Windows
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    try:
+        import httptools  # noqa: F401
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+    
+    # Each worker loads its own models and indices, so default to a single worker
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    
+    uvicorn.run(
+        "main:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=8000,
+        loop=loop,
+        http=http,
+        workers=workers
+    )
@@ -5,11 +5,17 @@ Provides patent-specific prompt templates and model management.
 """
 
 import time
+import string
+import asyncio
 import hashlib
-from typing import Dict, Any, Optional, List, Generator
-from functools import lru_cache
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Generator, AsyncGenerator
 import json
 
+from cachetools import LRUCache, TTLCache
+from starlette.concurrency import run_in_threadpool
+
 try:
     import ollama
     OLLAMA_AVAILABLE = True
@@ -17,10 +23,100 @@ except ImportError:
     OLLAMA_AVAILABLE = False
     print("Warning: Ollama not available. Install with: pip install ollama")
 
+# Sampling options shared by every generate call
+GENERATION_OPTIONS = {
+    'temperature': 0.7,
+    'top_p': 0.9,
+    'top_k': 40,
+    'repeat_penalty': 1.1
+}
+
+# Keep models resident between requests so Ollama never reloads them
+KEEP_ALIVE = "24h"
+
+# Streamed tokens are coalesced into one chunk per this many tokens
+STREAM_FLUSH_TOKENS = 8
+
+# Seconds to reuse a server availability / model presence check
+AVAILABILITY_TTL = 10
+MODEL_AVAILABLE_TTL = 300
+
+# Optional persistent draft cache, shared across restarts and worker processes
+try:
+    from diskcache import Cache as DiskCache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+DRAFT_CACHE_DIR = "./data/cache/drafts"
+DRAFT_CACHE_EXPIRE = 86400  # seconds
+
+# Prompt templates, parsed once at import
+PATENT_PROMPT_TEMPLATES = {
+    "utility": string.Template("""
+You are a patent attorney drafting a utility patent application. Based on this invention description: "$description"
+
+Generate a complete patent application draft including:
+
+1. TITLE OF THE INVENTION
+   [Generate a clear, descriptive title]
+
+2. FIELD OF THE INVENTION
+   [Describe the technical field this invention relates to]
+
+3. BACKGROUND OF THE INVENTION
+   [Describe the problem this invention solves and prior art limitations]
+
+4. SUMMARY OF THE INVENTION
+   [Provide a clear summary of the invention and its advantages]
+
+5. BRIEF DESCRIPTION OF THE DRAWINGS
+   [Describe any figures/diagrams that would illustrate the invention]
+
+6. DETAILED DESCRIPTION OF THE INVENTION
+   [Provide detailed technical description of the invention]
+
+7. CLAIMS
+   [Generate at least 3 independent claims and 2-3 dependent claims]
+
+Use formal patent language and proper structure. Be specific and technical.
+"""),
+    "software": string.Template("""
+You are a patent attorney specializing in software patents. Based on this software invention: "$description"
+
+Generate a software patent application draft including:
+
+1. TITLE OF THE INVENTION
+2. FIELD OF THE INVENTION  
+3. BACKGROUND OF THE INVENTION
+4. SUMMARY OF THE INVENTION
+5. BRIEF DESCRIPTION OF THE DRAWINGS
+6. DETAILED DESCRIPTION OF THE INVENTION
+7. CLAIMS
+
+Focus on the technical implementation, algorithms, and system architecture. Avoid abstract ideas and focus on concrete technical solutions.
+"""),
+    "medical": string.Template("""
+You are a patent attorney specializing in medical device patents. Based on this medical invention: "$description"
+
+Generate a medical device patent application draft including:
+
+1. TITLE OF THE INVENTION
+2. FIELD OF THE INVENTION
+3. BACKGROUND OF THE INVENTION  
+4. SUMMARY OF THE INVENTION
+5. BRIEF DESCRIPTION OF THE DRAWINGS
+6. DETAILED DESCRIPTION OF THE INVENTION
+7. CLAIMS
+
+Focus on medical applications, safety considerations, and regulatory compliance.
+""")
+}
+
 class OllamaService:
     """Service for generating patent drafts using local Ollama models."""
     
-    def __init__(self, model_name: str = "llama3.2:3b"):
+    def __init__(self, model_name: str = "llama3.2:3b", draft_cache_dir: Optional[str] = None):
         self.model_name = model_name
         self.client = ollama if OLLAMA_AVAILABLE else None
         self.available_models = {
@@ -30,15 +126,37 @@ class OllamaService:
             "codellama:7b": "Technical (7B parameters) - Best for technical content"
         }
         
+        # Generated drafts keyed on (description digest, model, template type)
+        self._draft_cache = LRUCache(maxsize=128)
+        self._draft_lock = threading.Lock()
+        # Second tier on disk when a directory is given and diskcache is installed
+        self._draft_disk = DiskCache(draft_cache_dir) if draft_cache_dir and DISKCACHE_AVAILABLE else None
+        
+        # AsyncClient shared by agenerate_patent_draft calls; bound to the event loop that created it
+        self._async_client = None
+        self._async_client_loop = None
+        
+        # Short-lived results of client.list() checks, so requests skip the round-trip
+        self._status_cache = TTLCache(maxsize=1, ttl=AVAILABILITY_TTL)
+        self._model_available = TTLCache(maxsize=32, ttl=MODEL_AVAILABLE_TTL)
+        self._status_lock = threading.Lock()
+        
     def is_available(self) -> bool:
         """Check if Ollama is available and running."""
         if not OLLAMA_AVAILABLE:
             return False
+        with self._status_lock:
+            available = self._status_cache.get("available")
+        if available is not None:
+            return available
         try:
             self.client.list()
-            return True
+            available = True
         except Exception:
-            return False
+            available = False
+        with self._status_lock:
+            self._status_cache["available"] = available
+        return available
     
     def get_available_models(self) -> Dict[str, str]:
         """Get list of available models."""
@@ -57,6 +175,9 @@ class OllamaService:
     
     def ensure_model_available(self, model_name: str) -> bool:
         """Ensure model is available, download if needed."""
+        with self._status_lock:
+            if model_name in self._model_available:
+                return True
         if not self.is_available():
             return False
         try:
@@ -67,6 +188,8 @@ class OllamaService:
                     print(f"Downloading model {model_name}...")
                     self.client.pull(model_name)
                     print(f"Model {model_name} downloaded successfully")
+                with self._status_lock:
+                    self._model_available[model_name] = True
                 return True
             else:
                 return False
@@ -76,97 +199,70 @@ class OllamaService:
     
     def _create_patent_prompt(self, description: str, template_type: str = "utility") -> str:
         """Create patent-specific prompt template."""
-        
-        templates = {
-            "utility": """
-You are a patent attorney drafting a utility patent application. Based on this invention description: "{description}"
-
-Generate a complete patent application draft including:
-
-1. TITLE OF THE INVENTION
-   [Generate a clear, descriptive title]
-
-2. FIELD OF THE INVENTION
-   [Describe the technical field this invention relates to]
-
-3. BACKGROUND OF THE INVENTION
-   [Describe the problem this invention solves and prior art limitations]
-
-4. SUMMARY OF THE INVENTION
-   [Provide a clear summary of the invention and its advantages]
-
-5. BRIEF DESCRIPTION OF THE DRAWINGS
-   [Describe any figures/diagrams that would illustrate the invention]
-
-6. DETAILED DESCRIPTION OF THE INVENTION
-   [Provide detailed technical description of the invention]
-
-7. CLAIMS
-   [Generate at least 3 independent claims and 2-3 dependent claims]
-
-Use formal patent language and proper structure. Be specific and technical.
-""",
-            "software": """
-You are a patent attorney specializing in software patents. Based on this software invention: "{description}"
-
-Generate a software patent application draft including:
-
-1. TITLE OF THE INVENTION
-2. FIELD OF THE INVENTION  
-3. BACKGROUND OF THE INVENTION
-4. SUMMARY OF THE INVENTION
-5. BRIEF DESCRIPTION OF THE DRAWINGS
-6. DETAILED DESCRIPTION OF THE INVENTION
-7. CLAIMS
-
-Focus on the technical implementation, algorithms, and system architecture. Avoid abstract ideas and focus on concrete technical solutions.
-""",
-            "medical": """
-You are a patent attorney specializing in medical device patents. Based on this medical invention: "{description}"
-
-Generate a medical device patent application draft including:
-
-1. TITLE OF THE INVENTION
-2. FIELD OF THE INVENTION
-3. BACKGROUND OF THE INVENTION  
-4. SUMMARY OF THE INVENTION
-5. BRIEF DESCRIPTION OF THE DRAWINGS
-6. DETAILED DESCRIPTION OF THE INVENTION
-7. CLAIMS
-
-Focus on medical applications, safety considerations, and regulatory compliance.
-"""
-        }
-        
-        template = templates.get(template_type, templates["utility"])
-        return template.format(description=description)
+        template = PATENT_PROMPT_TEMPLATES.get(template_type, PATENT_PROMPT_TEMPLATES["utility"])
+        return template.substitute(description=description)
+    
+    def warmup(self, model_name: str = None) -> bool:
+        """Load a model into memory with a 1-token generation so the first real request is fast."""
+        if not self.is_available():
+            return False
+        model = model_name or self.model_name
+        try:
+            self.client.generate(
+                model=model,
+                prompt="hi",
+                options={"num_predict": 1, "temperature": 0.0},
+                keep_alive=KEEP_ALIVE
+            )
+            return True
+        except Exception as e:
+            print(f"Error warming up model {model}: {e}")
+            return False
     
     def validate_description(self, description: str) -> bool:
         """Validate invention description."""
-        if not description or not description.strip():
+        if not description:
+            raise ValueError("Description cannot be empty")
+        stripped_length = len(description.strip())
+        if stripped_length == 0:
             raise ValueError("Description cannot be empty")
-        if len(description.strip()) < 50:
+        if stripped_length < 50:
             raise ValueError("Description too short (minimum 50 characters)")
         if len(description) > 5000:
             raise ValueError("Description too long (maximum 5000 characters)")
         return True
     
-    @lru_cache(maxsize=100)
-    def generate_cached_draft(self, description_hash: str, model_name: str, template_type: str) -> str:
-        """Generate draft with caching to avoid regeneration."""
-        # This is a placeholder - in practice, you'd need to store the description
-        # and retrieve it from the hash, or implement a different caching strategy
-        return self.generate_patent_draft("", model_name, template_type)
+    def _draft_cache_key(self, description: str, model: str, template_type: str) -> tuple:
+        """Content-addressed cache key for a draft request."""
+        digest = hashlib.blake2b(description.encode("utf-8"), digest_size=16).digest()
+        return (digest, model, template_type)
     
-    def generate_patent_draft(self, description: str, model_name: str = None, 
-                            template_type: str = "utility", use_cache: bool = True) -> Dict[str, Any]:
-        """Generate patent draft using Ollama."""
+    def _get_cached_draft(self, cache_key: tuple) -> Optional[Dict[str, Any]]:
+        """Look up a draft in memory, then on disk (promoting disk hits to memory)."""
+        with self._draft_lock:
+            cached_result = self._draft_cache.get(cache_key)
+        if cached_result is None and self._draft_disk is not None:
+            cached_result = self._draft_disk.get(cache_key)
+            if cached_result is not None:
+                with self._draft_lock:
+                    self._draft_cache[cache_key] = cached_result
+        return cached_result
+    
+    def _store_draft(self, cache_key: tuple, result: Dict[str, Any]) -> None:
+        """Store a generated draft in every cache tier."""
+        with self._draft_lock:
+            self._draft_cache[cache_key] = result
+        if self._draft_disk is not None:
+            self._draft_disk.set(cache_key, result, expire=DRAFT_CACHE_EXPIRE)
+    
+    def _check_draft_request(self, description: str, model_name: str = None) -> str:
+        """Validate a draft request and return the model to use."""
+        # Validate inputs first so bad input fails without a round-trip to Ollama
+        self.validate_description(description)
+        
         if not self.is_available():
             raise RuntimeError("Ollama is not available. Please install and start Ollama.")
         
-        # Validate inputs
-        self.validate_description(description)
-        
         # Use provided model or default
         model = model_name or self.model_name
         
@@ -174,21 +270,19 @@ Focus on medical applications, safety considerations, and regulatory compliance.
         if not self.ensure_model_available(model):
             raise RuntimeError(f"Model {model} is not available")
         
+        return model
+    
+    def generate_patent_draft(self, description: str, model_name: str = None, 
+                            template_type: str = "utility", use_cache: bool = True) -> Dict[str, Any]:
+        """Generate patent draft using Ollama."""
+        model = self._check_draft_request(description, model_name)
+        
         # Check cache if enabled
+        cache_key = self._draft_cache_key(description, model, template_type)
         if use_cache:
-            description_hash = hashlib.md5(description.encode()).hexdigest()
-            try:
-                cached_result = self.generate_cached_draft(description_hash, model, template_type)
-                if cached_result:
-                    return {
-                        "draft": cached_result,
-                        "model": model,
-                        "template_type": template_type,
-                        "cached": True,
-                        "generation_time": 0.0
-                    }
-            except:
-                pass  # Continue with generation if cache fails
+            cached_result = self._get_cached_draft(cache_key)
+            if cached_result is not None:
+                return {**cached_result, "cached": True, "generation_time": 0.0}
         
         # Create prompt
         prompt = self._create_patent_prompt(description, template_type)
@@ -199,16 +293,12 @@ Focus on medical applications, safety considerations, and regulatory compliance.
             response = self.client.generate(
                 model=model,
                 prompt=prompt,
-                options={
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'repeat_penalty': 1.1
-                }
+                options=GENERATION_OPTIONS,
+                keep_alive=KEEP_ALIVE
             )
             generation_time = time.time() - start_time
             
-            return {
+            result = {
                 "draft": response['response'],
                 "model": model,
                 "template_type": template_type,
@@ -216,36 +306,191 @@ Focus on medical applications, safety considerations, and regulatory compliance.
                 "generation_time": generation_time
             }
             
+            if use_cache:
+                self._store_draft(cache_key, result)
+            
+            return dict(result)
+            
         except Exception as e:
             raise RuntimeError(f"Failed to generate draft: {str(e)}")
     
-    def generate_draft_stream(self, description: str, model_name: str = None, 
-                           template_type: str = "utility") -> Generator[str, None, None]:
-        """Generate draft with streaming for real-time updates."""
+    async def _agenerate(self, client, prompt: str, model: str) -> Dict[str, Any]:
+        """Run one generate call on an async client and time it."""
+        start_time = time.time()
+        response = await client.generate(model=model, prompt=prompt, options=GENERATION_OPTIONS,
+                                         keep_alive=KEEP_ALIVE)
+        return {"draft": response['response'], "generation_time": time.time() - start_time}
+    
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = ollama.AsyncClient()
+            self._async_client_loop = loop
+        return self._async_client
+    
+    async def agenerate_patent_draft(self, description: str, model_name: str = None,
+                                     template_type: str = "utility", use_cache: bool = True) -> Dict[str, Any]:
+        """Async generate_patent_draft; concurrent calls share one client and run in parallel."""
+        # Availability checks and a possible model pull are blocking calls
+        model = await run_in_threadpool(self._check_draft_request, description, model_name)
+        
+        cache_key = self._draft_cache_key(description, model, template_type)
+        if use_cache:
+            cached_result = self._get_cached_draft(cache_key)
+            if cached_result is not None:
+                return {**cached_result, "cached": True, "generation_time": 0.0}
+        
+        prompt = self._create_patent_prompt(description, template_type)
+        try:
+            output = await self._agenerate(self._get_async_client(), prompt, model)
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate draft: {str(e)}")
+        
+        result = {
+            "draft": output["draft"],
+            "model": model,
+            "template_type": template_type,
+            "cached": False,
+            "generation_time": output["generation_time"]
+        }
+        if use_cache:
+            self._store_draft(cache_key, result)
+        return dict(result)
+    
+    async def generate_patent_drafts_batch(self, descriptions: List[str], model_name: str = None,
+                                           template_type: str = "utility",
+                                           use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Generate drafts for several descriptions concurrently.
+        
+        Requests are issued together so the Ollama server can run them in parallel
+        (see OLLAMA_NUM_PARALLEL in OLLAMA_SETUP_GUIDE.md). Results are returned in
+        the same order as the descriptions; a description whose generation failed
+        gets a result with "draft" set to None and an "error" message.
+        """
+        for description in descriptions:
+            self.validate_description(description)
+        
+        if not await run_in_threadpool(self.is_available):
+            raise RuntimeError("Ollama is not available. Please install and start Ollama.")
+        
+        model = model_name or self.model_name
+        if not await run_in_threadpool(self.ensure_model_available, model):
+            raise RuntimeError(f"Model {model} is not available")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(descriptions)
+        pending = []
+        for i, description in enumerate(descriptions):
+            cache_key = self._draft_cache_key(description, model, template_type)
+            if use_cache:
+                cached_result = self._get_cached_draft(cache_key)
+                if cached_result is not None:
+                    results[i] = {**cached_result, "cached": True, "generation_time": 0.0}
+                    continue
+            pending.append((i, cache_key, self._create_patent_prompt(description, template_type)))
+        
+        if pending:
+            # The async client is bound to the running event loop, so create it per batch
+            client = ollama.AsyncClient()
+            # One failed generation must not discard the drafts that succeeded
+            generated = await asyncio.gather(
+                *[self._agenerate(client, prompt, model) for _, _, prompt in pending],
+                return_exceptions=True
+            )
+            
+            for (i, cache_key, _), output in zip(pending, generated):
+                if isinstance(output, BaseException):
+                    results[i] = {
+                        "draft": None,
+                        "model": model,
+                        "template_type": template_type,
+                        "cached": False,
+                        "generation_time": 0.0,
+                        "error": f"Failed to generate draft: {str(output)}"
+                    }
+                    continue
+                result = {
+                    "draft": output["draft"],
+                    "model": model,
+                    "template_type": template_type,
+                    "cached": False,
+                    "generation_time": output["generation_time"]
+                }
+                if use_cache:
+                    self._store_draft(cache_key, result)
+                results[i] = dict(result)
+        
+        return results
+    
+    def generate_patent_drafts(self, descriptions: List[str], model_name: str = None,
+                               template_type: str = "utility",
+                               use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Synchronous wrapper for generate_patent_drafts_batch (safe inside a running event loop)."""
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(
+                asyncio.run,
+                self.generate_patent_drafts_batch(descriptions, model_name, template_type, use_cache)
+            ).result()
+    
+    def _prepare_stream(self, description: str, model_name: str, template_type: str) -> tuple:
+        """Validate a streaming request and return (model, prompt)."""
+        self.validate_description(description)
+        
         if not self.is_available():
             raise RuntimeError("Ollama is not available")
         
-        self.validate_description(description)
         model = model_name or self.model_name
         
         if not self.ensure_model_available(model):
             raise RuntimeError(f"Model {model} is not available")
         
-        prompt = self._create_patent_prompt(description, template_type)
+        return model, self._create_patent_prompt(description, template_type)
+    
+    def generate_draft_stream(self, description: str, model_name: str = None, 
+                           template_type: str = "utility") -> Generator[bytes, None, None]:
+        """Generate draft with streaming for real-time updates (UTF-8 bytes, several tokens per chunk)."""
+        model, prompt = self._prepare_stream(description, model_name, template_type)
         
+        buffer = []
         try:
             for chunk in self.client.generate(
                 model=model,
                 prompt=prompt,
                 stream=True,
-                options={
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'repeat_penalty': 1.1
-                }
+                options=GENERATION_OPTIONS,
+                keep_alive=KEEP_ALIVE
+            ):
+                buffer.append(chunk['response'])
+                if len(buffer) >= STREAM_FLUSH_TOKENS or chunk.get('done'):
+                    yield "".join(buffer).encode("utf-8")
+                    buffer.clear()
+            if buffer:
+                yield "".join(buffer).encode("utf-8")
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate streaming draft: {str(e)}")
+    
+    async def agenerate_draft_stream(self, description: str, model_name: str = None,
+                                     template_type: str = "utility") -> AsyncGenerator[bytes, None]:
+        """Async variant of generate_draft_stream using ollama.AsyncClient."""
+        # Availability checks and a possible model pull are blocking calls
+        model, prompt = await run_in_threadpool(self._prepare_stream, description, model_name, template_type)
+        
+        client = ollama.AsyncClient()
+        buffer = []
+        try:
+            async for chunk in await client.generate(
+                model=model,
+                prompt=prompt,
+                stream=True,
+                options=GENERATION_OPTIONS,
+                keep_alive=KEEP_ALIVE
             ):
-                yield chunk['response']
+                buffer.append(chunk['response'])
+                if len(buffer) >= STREAM_FLUSH_TOKENS or chunk.get('done'):
+                    yield "".join(buffer).encode("utf-8")
+                    buffer.clear()
+            if buffer:
+                yield "".join(buffer).encode("utf-8")
         except Exception as e:
             raise RuntimeError(f"Failed to generate streaming draft: {str(e)}")
     
@@ -272,15 +517,24 @@ Focus on medical applications, safety considerations, and regulatory compliance.
 
 # Global service instance
 _ollama_service = None
+_ollama_service_lock = threading.Lock()
 
 def get_ollama_service() -> OllamaService:
     """Get global Ollama service instance."""
     global _ollama_service
     if _ollama_service is None:
-        _ollama_service = OllamaService()
+        with _ollama_service_lock:
+            if _ollama_service is None:
+                _ollama_service = OllamaService(draft_cache_dir=DRAFT_CACHE_DIR)
     return _ollama_service
 
 
+def warm_up_ollama_service() -> bool:
+    """Load the default model; blocking, so call it from a background thread."""
+    # Runs after the singleton is published so requests never wait on model load
+    return get_ollama_service().warmup()
+
+
 if __name__ == "__main__":
     # Test the service
     service = OllamaService()
@@ -4,56 +4,105 @@ Optimized search service with caching and performance improvements.
 This module provides cached versions of search functions for better API performance.
 """
 
+import os
 import time
 import threading
 from typing import List, Dict, Any, Tuple, Optional
 from pathlib import Path
 import json
 
+import numpy as np
+from cachetools import LRUCache
+from sklearn.preprocessing import normalize
+
+from search_utils import (
+    load_patent_metadata, rerank_results, get_chunk_text, get_chunk_texts, fuse_scores
+)
+
 # Global caches for models and indices
 _model_cache = {}
 _index_cache = {}
 _cache_lock = threading.Lock()
 
+# Optional int8-quantized ONNX encoder, e.g. SEMANTIC_BACKEND=onnx
+SEMANTIC_BACKEND = os.environ.get("SEMANTIC_BACKEND", "torch")
+SEMANTIC_ONNX_FILE = os.environ.get("SEMANTIC_ONNX_FILE", "onnx/model_qint8_avx512.onnx")
+
+def _load_sentence_model(model_name: str):
+    """Load a SentenceTransformer, using the ONNX backend when configured."""
+    from sentence_transformers import SentenceTransformer
+    if SEMANTIC_BACKEND == "onnx":
+        try:
+            return SentenceTransformer(model_name, backend="onnx",
+                                       model_kwargs={"file_name": SEMANTIC_ONNX_FILE})
+        except Exception as e:
+            print(f"ONNX backend unavailable for {model_name}, using default: {e}")
+    return SentenceTransformer(model_name)
+
+# Cache getters use double-checked locking: hits are a lock-free dict read
+# (atomic under the GIL); the lock is only taken to load on a miss.
+
 def get_cached_model(model_name: str):
     """Get cached model or load and cache it."""
+    model = _model_cache.get(model_name)
+    if model is not None:
+        return model
     with _cache_lock:
-        if model_name not in _model_cache:
-            from sentence_transformers import SentenceTransformer
+        model = _model_cache.get(model_name)
+        if model is None:
             print(f"Loading model {model_name}...")
-            _model_cache[model_name] = SentenceTransformer(model_name)
+            model = _load_sentence_model(model_name)
+            _model_cache[model_name] = model
             print(f"Model {model_name} loaded and cached")
-        return _model_cache[model_name]
+        return model
 
 def get_cached_tfidf_index():
     """Get cached TF-IDF index or load and cache it."""
+    index = _index_cache.get('tfidf')
+    if index is not None:
+        return index
     with _cache_lock:
-        if 'tfidf' not in _index_cache:
+        index = _index_cache.get('tfidf')
+        if index is None:
             from embed_tfidf import load_index
             print("Loading TF-IDF index...")
-            _index_cache['tfidf'] = load_index()
+            vectorizer, matrix, ids = load_index()
+            # Rows are L2-normalized once so a query is a single sparse dot product
+            matrix = normalize(matrix.tocsr(), norm="l2", copy=False)
+            index = (vectorizer, matrix, ids)
+            _index_cache['tfidf'] = index
             print("TF-IDF index loaded and cached")
-        return _index_cache['tfidf']
+        return index
 
 def get_cached_semantic_index():
     """Get cached semantic index or load and cache it."""
+    index = _index_cache.get('semantic')
+    if index is not None:
+        return index
     with _cache_lock:
-        if 'semantic' not in _index_cache:
+        index = _index_cache.get('semantic')
+        if index is None:
             from embed_semantic import load_semantic_index
             print("Loading semantic index...")
-            _index_cache['semantic'] = load_semantic_index()
+            index = load_semantic_index()
+            _index_cache['semantic'] = index
             print("Semantic index loaded and cached")
-        return _index_cache['semantic']
+        return index
 
 def optimized_tfidf_search(query: str, top_k: int = 5) -> List[Tuple[str, float]]:
     """Optimized TF-IDF search with caching."""
     try:
         vectorizer, matrix, ids = get_cached_tfidf_index()
         
-        from sklearn.metrics.pairwise import cosine_similarity
-        query_vec = vectorizer.transform([query])
-        sims = cosine_similarity(query_vec, matrix).ravel()
-        top_idx = sims.argsort()[::-1][:top_k]
+        query_vec = normalize(vectorizer.transform([query]), norm="l2", copy=False)
+        sims = (query_vec @ matrix.T).toarray().ravel()
+        
+        # Partial selection of the top k, then sort only those
+        if top_k < len(sims):
+            top_idx = np.argpartition(-sims, top_k)[:top_k]
+        else:
+            top_idx = np.arange(len(sims))
+        top_idx = top_idx[np.argsort(-sims[top_idx])]
         
         return [(ids[i], float(sims[i])) for i in top_idx]
     except Exception as e:
@@ -71,17 +120,19 @@ def optimized_tfidf_search_with_metadata(query: str, top_k: int = 5) -> List[Tup
         # Load metadata efficiently
         metadata = _load_patent_metadata_cached()
         
+        # Fetch all chunk texts for snippets at once
+        chunk_texts = _get_chunk_texts_batch([doc_id for doc_id, _ in results])
+        
         # Enrich results with metadata
         enriched_results = []
         for doc_id, score in results:
             # Extract base doc_id (remove chunk suffix)
-            base_doc_id = doc_id.split('_chunk')[0] if '_chunk' in doc_id else doc_id
+            base_doc_id = doc_id.partition('_chunk')[0]
             
             # Get metadata for base document
             base_meta = metadata.get(base_doc_id, {})
             
-            # Get chunk text for snippet
-            chunk_text = _get_chunk_text_cached(doc_id)
+            chunk_text = chunk_texts.get(doc_id)
             
             enriched_results.append((
                 doc_id,
@@ -104,23 +155,23 @@ def optimized_semantic_search(query: str, top_k: int = 5, rerank: bool = False,
                             keyword_weight: float = 0.3, semantic_weight: float = 0.7) -> List[Tuple[str, float, Dict[str, Any]]]:
     """Optimized semantic search with caching."""
     try:
-        import numpy as np
-        
         # Get cached index and model
         index, ids, metadata, model_name = get_cached_semantic_index()
         model = get_cached_model(model_name)
         
-        # Encode query
-        query_embedding = model.encode([query])
-        query_embedding = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
+        # Encode query (reuses embeddings primed by encode_queries)
+        query_embedding = _encode_query(model, query)
         
         # Search FAISS index
         search_k = top_k * 3 if rerank else top_k
-        scores, indices = index.search(query_embedding.astype('float32'), search_k)
+        from embed_semantic import search_params
+        scores, indices = index.search(query_embedding, search_k, params=search_params(index, search_k))
         
         # Load patent metadata for enrichment
-        from search_utils import load_patent_metadata
-        patent_metadata = load_patent_metadata()
+        patent_metadata = _load_patent_metadata_cached()
+        
+        # Fetch all chunk texts at once
+        chunk_texts = _get_chunk_texts_batch([ids[idx] for idx in indices[0] if idx != -1])
         
         # Get results
         results = []
@@ -132,13 +183,13 @@ def optimized_semantic_search(query: str, top_k: int = 5, rerank: bool = False,
             chunk_meta = metadata[idx]
             
             # Get base document ID
-            base_doc_id = doc_id.split('_chunk')[0] if '_chunk' in doc_id else doc_id
+            base_doc_id = doc_id.partition('_chunk')[0]
             
             # Get patent metadata
             patent_meta = patent_metadata.get(base_doc_id, {})
             
             # Get chunk text
-            chunk_text = _get_chunk_text_cached(doc_id)
+            chunk_text = chunk_texts.get(doc_id)
             
             # Combine metadata
             enriched_meta = {
@@ -153,25 +204,38 @@ def optimized_semantic_search(query: str, top_k: int = 5, rerank: bool = False,
         
         # Re-rank if requested
         if rerank and len(results) > top_k:
-            from search_utils import rerank_results
             reranked = rerank_results(
                 [(doc_id, score) for doc_id, score, _ in results],
                 query,
                 keyword_weight=keyword_weight,
-                semantic_weight=semantic_weight
+                semantic_weight=semantic_weight,
+                top_k=top_k
             )
             
-            # Rebuild results with re-ranked scores
-            reranked_dict = {doc_id: score for doc_id, score in reranked}
-            results = [(doc_id, reranked_dict.get(doc_id, score), meta) 
-                      for doc_id, score, meta in results 
-                      if doc_id in reranked_dict]
+            # Rebuild results in re-ranked order
+            metas = {doc_id: meta for doc_id, _, meta in results}
+            results = [(doc_id, score, metas[doc_id]) for doc_id, score in reranked]
         
         return results[:top_k]
     except Exception as e:
         print(f"Semantic search error: {e}")
         return []
 
+def _fuse_scores(tfidf_results: List[Tuple[str, float, Dict[str, Any]]],
+                 semantic_results: List[Tuple[str, float, Dict[str, Any]]],
+                 tfidf_weight: float, semantic_weight: float,
+                 top_k: Optional[int] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """search_utils.fuse_scores (CombSUM) over enriched results, keeping each doc's metadata."""
+    # TF-IDF metadata wins for docs found by both
+    metas = {doc_id: meta for doc_id, _, meta in semantic_results}
+    metas.update((doc_id, meta) for doc_id, _, meta in tfidf_results)
+    fused = fuse_scores(
+        [(doc_id, score) for doc_id, score, _ in tfidf_results],
+        [(doc_id, score) for doc_id, score, _ in semantic_results],
+        tfidf_weight=tfidf_weight, semantic_weight=semantic_weight, top_k=top_k
+    )
+    return [(doc_id, score, metas[doc_id]) for doc_id, score in fused]
+
 def optimized_hybrid_search(query: str, top_k: int = 5, alpha: float = 0.5, 
                           rerank: bool = False, keyword_weight: float = 0.3, 
                           semantic_weight: float = 0.7) -> List[Tuple[str, float, Dict[str, Any]]]:
@@ -181,53 +245,23 @@ def optimized_hybrid_search(query: str, top_k: int = 5, alpha: float = 0.5,
         tfidf_results = optimized_tfidf_search_with_metadata(query, top_k=top_k*2)
         semantic_results = optimized_semantic_search(query, top_k=top_k*2, rerank=False)
         
-        # Combine scores
-        combined_scores = {}
-        
-        # Add TF-IDF scores
-        for doc_id, score, meta in tfidf_results:
-            combined_scores[doc_id] = {
-                'tfidf_score': score,
-                'semantic_score': 0.0,
-                'metadata': meta
-            }
-        
-        # Add semantic scores
-        for doc_id, score, meta in semantic_results:
-            if doc_id in combined_scores:
-                combined_scores[doc_id]['semantic_score'] = score
-            else:
-                combined_scores[doc_id] = {
-                    'tfidf_score': 0.0,
-                    'semantic_score': score,
-                    'metadata': meta
-                }
-        
-        # Calculate combined scores
-        final_results = []
-        for doc_id, scores in combined_scores.items():
-            combined_score = (alpha * scores['semantic_score'] + 
-                            (1 - alpha) * scores['tfidf_score'])
-            final_results.append((doc_id, combined_score, scores['metadata']))
-        
-        # Sort by combined score
-        final_results.sort(key=lambda x: x[1], reverse=True)
+        # Combine and sort by weighted score
+        final_results = _fuse_scores(tfidf_results, semantic_results,
+                                     tfidf_weight=1 - alpha, semantic_weight=alpha)
         
         # Re-rank if requested
         if rerank and len(final_results) > top_k:
-            from search_utils import rerank_results
             reranked = rerank_results(
                 [(doc_id, score) for doc_id, score, _ in final_results],
                 query,
                 keyword_weight=keyword_weight,
-                semantic_weight=semantic_weight
+                semantic_weight=semantic_weight,
+                top_k=top_k
             )
             
-            # Rebuild results with re-ranked scores
-            reranked_dict = {doc_id: score for doc_id, score in reranked}
-            final_results = [(doc_id, reranked_dict.get(doc_id, score), meta) 
-                           for doc_id, score, meta in final_results 
-                           if doc_id in reranked_dict]
+            # Rebuild results in re-ranked order
+            metas = {doc_id: meta for doc_id, _, meta in final_results}
+            final_results = [(doc_id, score, metas[doc_id]) for doc_id, score in reranked]
         
         return final_results[:top_k]
     except Exception as e:
@@ -243,64 +277,145 @@ def optimized_hybrid_advanced_search(query: str, top_k: int = 5,
         tfidf_results = optimized_tfidf_search_with_metadata(query, top_k=top_k*2)
         semantic_results = optimized_semantic_search(query, top_k=top_k*2, rerank=False)
         
-        # Combine scores with custom weights
-        combined_scores = {}
-        
-        # Add TF-IDF scores
-        for doc_id, score, meta in tfidf_results:
-            combined_scores[doc_id] = {
-                'tfidf_score': score,
-                'semantic_score': 0.0,
-                'metadata': meta
-            }
-        
-        # Add semantic scores
-        for doc_id, score, meta in semantic_results:
-            if doc_id in combined_scores:
-                combined_scores[doc_id]['semantic_score'] = score
-            else:
-                combined_scores[doc_id] = {
-                    'tfidf_score': 0.0,
-                    'semantic_score': score,
-                    'metadata': meta
-                }
-        
-        # Calculate combined scores with custom weights
-        final_results = []
-        for doc_id, scores in combined_scores.items():
-            combined_score = (tfidf_weight * scores['tfidf_score'] + 
-                            semantic_weight * scores['semantic_score'])
-            final_results.append((doc_id, combined_score, scores['metadata']))
-        
-        # Sort by combined score
-        final_results.sort(key=lambda x: x[1], reverse=True)
-        
-        return final_results[:top_k]
+        # Combine scores with custom weights, keeping the top k
+        return _fuse_scores(tfidf_results, semantic_results,
+                            tfidf_weight=tfidf_weight, semantic_weight=semantic_weight,
+                            top_k=top_k)
     except Exception as e:
         print(f"Hybrid advanced search error: {e}")
         return []
 
-# Cached metadata loading
-_metadata_cache = None
-_chunk_text_cache = {}
+# Cached chunk text loading
+_chunk_text_cache = LRUCache(maxsize=50000)
+_chunk_text_lock = threading.Lock()
 
-def _load_patent_metadata_cached() -> Dict[str, Dict[str, Any]]:
-    """Load patent metadata with caching."""
-    global _metadata_cache
+# Optional on-disk second tier for chunk texts so restarts start warm.
+# Keys carry the chunks.jsonl mtime so a rebuilt corpus never serves stale text.
+try:
+    from diskcache import Cache as DiskCache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+_CHUNK_DISK_DIR = "./data/cache/chunks"
+_chunk_disk = None
+_chunk_disk_lock = threading.Lock()
+_CHUNKS_FILE = Path("./data/processed/chunks.jsonl")
+
+def _get_chunk_disk():
+    """Open the on-disk chunk cache on first use (None without diskcache)."""
+    global _chunk_disk
+    if _chunk_disk is None and DISKCACHE_AVAILABLE:
+        with _chunk_disk_lock:
+            if _chunk_disk is None:
+                _chunk_disk = DiskCache(_CHUNK_DISK_DIR, size_limit=2**32)
+    return _chunk_disk
+
+def _chunks_version() -> int:
+    """Current chunks.jsonl mtime, read per lookup so a rebuild takes effect without a restart."""
+    try:
+        return _CHUNKS_FILE.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+# Query embeddings primed by batch requests
+_query_embedding_cache = {}
+_QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+def _encode_query(model, query: str):
+    """Get a normalized float32 query embedding of shape (1, dim)."""
+    embedding = _query_embedding_cache.get(query)
+    if embedding is None:
+        embedding = model.encode([query], normalize_embeddings=True,
+                                 convert_to_numpy=True).astype('float32', copy=False)
+    return embedding
+
+def encode_queries(queries: List[str], batch_size: int = 64) -> None:
+    """Embed many queries in one batched forward pass and cache the results."""
+    pending = [q for q in dict.fromkeys(queries) if q not in _query_embedding_cache]
+    if not pending:
+        return
     
-    if _metadata_cache is None:
-        from search_utils import load_patent_metadata
-        _metadata_cache = load_patent_metadata()
+    _, _, _, model_name = get_cached_semantic_index()
+    model = get_cached_model(model_name)
     
-    return _metadata_cache
+    embeddings = model.encode(pending, batch_size=batch_size, normalize_embeddings=True,
+                              convert_to_numpy=True).astype('float32', copy=False)
+    
+    if len(_query_embedding_cache) + len(pending) > _QUERY_EMBEDDING_CACHE_SIZE:
+        _query_embedding_cache.clear()
+    for query, embedding in zip(pending, embeddings):
+        _query_embedding_cache[query] = embedding.reshape(1, -1)
+
+def embed_query(query: str):
+    """Get the normalized embedding for one query and keep it for the search that follows."""
+    encode_queries([query])
+    embedding = _query_embedding_cache.get(query)
+    if embedding is None:
+        # Evicted by a concurrent batch between encoding and lookup
+        _, _, _, model_name = get_cached_semantic_index()
+        embedding = _encode_query(get_cached_model(model_name), query)
+    return embedding
+
+def _load_patent_metadata_cached() -> Dict[str, Dict[str, Any]]:
+    """Load patent metadata with caching."""
+    # search_utils memoizes on the files' mtime/size, so a rebuilt dataset is picked up
+    return load_patent_metadata()
 
 def _get_chunk_text_cached(chunk_id: str) -> Optional[str]:
     """Get chunk text with caching."""
-    if chunk_id not in _chunk_text_cache:
-        from search_utils import get_chunk_text
-        _chunk_text_cache[chunk_id] = get_chunk_text(chunk_id)
+    # LRUCache reorders on read, so every access goes through its lock
+    with _chunk_text_lock:
+        if chunk_id in _chunk_text_cache:
+            return _chunk_text_cache[chunk_id]
     
-    return _chunk_text_cache.get(chunk_id)
+    chunk_disk = _get_chunk_disk()
+    disk_key = (chunk_id, _chunks_version())
+    text = chunk_disk.get(disk_key) if chunk_disk is not None else None
+    if text is None:
+        text = get_chunk_text(chunk_id)
+        if text is not None and chunk_disk is not None:
+            chunk_disk.set(disk_key, text)
+    with _chunk_text_lock:
+        _chunk_text_cache[chunk_id] = text
+    return text
+
+def _get_chunk_texts_batch(chunk_ids: List[str]) -> Dict[str, Optional[str]]:
+    """Get text for many chunks, loading all cache misses in one pass."""
+    texts = {}
+    missing = []
+    with _chunk_text_lock:
+        for chunk_id in chunk_ids:
+            if chunk_id in _chunk_text_cache:
+                texts[chunk_id] = _chunk_text_cache[chunk_id]
+            else:
+                missing.append(chunk_id)
+    
+    chunk_disk = _get_chunk_disk() if missing else None
+    version = _chunks_version() if chunk_disk is not None else 0
+    if chunk_disk is not None:
+        on_disk = {}
+        for chunk_id in missing:
+            text = chunk_disk.get((chunk_id, version))
+            if text is not None:
+                on_disk[chunk_id] = text
+        missing = [chunk_id for chunk_id in missing if chunk_id not in on_disk]
+        with _chunk_text_lock:
+            for chunk_id, text in on_disk.items():
+                _chunk_text_cache[chunk_id] = text
+        texts.update(on_disk)
+    
+    if missing:
+        loaded = get_chunk_texts(missing)
+        with _chunk_text_lock:
+            for chunk_id, text in loaded.items():
+                _chunk_text_cache[chunk_id] = text
+        if chunk_disk is not None:
+            for chunk_id, text in loaded.items():
+                if text is not None:
+                    chunk_disk.set((chunk_id, version), text)
+        texts.update(loaded)
+    
+    return texts
 
 def warm_up_caches():
     """Warm up all caches for better performance."""
@@ -315,8 +430,10 @@ def warm_up_caches():
     
     # Warm up semantic
     try:
-        get_cached_semantic_index()
-        get_cached_model("all-MiniLM-L6-v2")
+        _, _, _, model_name = get_cached_semantic_index()
+        model = get_cached_model(model_name)
+        # First encode initializes kernels; keep that off the request path
+        model.encode(["warmup"])
         print("Semantic cache warmed up")
     except Exception as e:
         print(f"Semantic cache warm-up failed: {e}")
@@ -1,97 +1,174 @@
 import os
+import queue
 import json
+import mmap
 import re
-import xml.etree.ElementTree as ET
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+# lxml parses several times faster than the stdlib; fall back to ElementTree if missing
+try:
+    from lxml import etree
+    LXML_PARSER = etree.XMLParser(recover=True, huge_tree=True, resolve_entities=False)
+    XMLParseError = etree.XMLSyntaxError
+except ImportError:
+    import xml.etree.ElementTree as etree
+    LXML_PARSER = None
+    XMLParseError = etree.ParseError
+
+# orjson serializes straight to UTF-8 bytes; fall back to stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+WRITE_BUFFER_SIZE = 1 << 20
+PIPELINE_QUEUE_SIZE = 256
 
 DATA_DIR = "./data"
 GRANTS_DIR = os.path.join(DATA_DIR, "grants")
 APPLICATIONS_DIR = os.path.join(DATA_DIR, "applications")
 PROCESSED_DIR = os.path.join(DATA_DIR, "processed")
-os.makedirs(PROCESSED_DIR, exist_ok=True)
 
 def strip_namespace(tag):
     return tag.split("}")[-1] if "}" in tag else tag
 
 def split_records(file_path, record_tag):
-    # Yield one <record_tag> and </record_tag> string at a time.
-    start_pat = f"<{record_tag}"
-    end_pat = f"</{record_tag}>"
-    buffer = []
-    inside_record = False
-
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if start_pat in line:
-                inside_record = True
-                buffer = [line]
-            elif inside_record:
-                buffer.append(line)
-
-            if inside_record and end_pat in line:
-                inside_record = False
-                yield "".join(buffer)
+    # Yield one <record_tag> ... </record_tag> string at a time.
+    # Scans the memory-mapped file with bytes.find instead of decoding line by line.
+    start_tok = f"<{record_tag}".encode("utf-8")
+    end_tok = f"</{record_tag}>".encode("utf-8")
+
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            pos = 0
+            while True:
+                start = mm.find(start_tok, pos)
+                if start == -1:
+                    break
+                end = mm.find(end_tok, start)
+                if end == -1:
+                    break
+                end += len(end_tok)
+                yield mm[start:end].decode("utf-8", errors="ignore")
+                pos = end
 
 def parse_record(xml_string, record_tag):
     try:
-        root = ET.fromstring(xml_string)
-        if strip_namespace(root.tag) != record_tag:
+        if LXML_PARSER is not None:
+            root = etree.fromstring(xml_string.encode("utf-8"), LXML_PARSER)
+        else:
+            root = etree.fromstring(xml_string)
+        if root is None or strip_namespace(root.tag) != record_tag:
             return None
-        return extract_metadata(root)
-    except ET.ParseError as e:
+        data = extract_metadata(root)
+        root.clear()
+        return data
+    except XMLParseError as e:
         print(f"skipping record due to parse error: {e}")
         return None
 
+def _joined_text(elem):
+    return " ".join(t.strip() for t in elem.itertext())
+
 def extract_metadata(patent_elem):
-    # extracts full metadata from a single patent record.
-    data = {}
-
-    # document ID (combined country + doc-number + kind)
-    pub_ref = patent_elem.find(".//publication-reference/document-id")
-    if pub_ref is not None:
-        country = (pub_ref.findtext("country") or "").strip()
-        doc_num = (pub_ref.findtext("doc-number") or "").strip()
-        kind = (pub_ref.findtext("kind") or "").strip()
-        data["doc_id"] = f"{country}{doc_num}{kind}".strip()
-    else:
-        data["doc_id"] = ""
-
-    # title
-    title_elem = patent_elem.find(".//invention-title")
-    data["title"] = title_elem.text.strip() if title_elem is not None and title_elem.text else ""
-
-    # abstract
-    abstract_elem = patent_elem.find(".//abstract")
-    data["abstract"] = " ".join(t.strip() for t in abstract_elem.itertext()) if abstract_elem is not None else ""
-
-    # claims
-    claims_elem = patent_elem.find(".//claims")
-    data["claims"] = " ".join(t.strip() for t in claims_elem.itertext()) if claims_elem is not None else ""
-
-    # description
-    desc_elem = patent_elem.find(".//description")
-    data["description"] = " ".join(t.strip() for t in desc_elem.itertext()) if desc_elem is not None else ""
+    # extracts full metadata from a single patent record in one pass over the tree.
+    data = {"doc_id": "", "title": "", "abstract": "", "claims": "", "description": ""}
+    seen = set()
+
+    for elem in patent_elem.iter():
+        if not isinstance(elem.tag, str):
+            continue  # comments / processing instructions (lxml)
+        tag = strip_namespace(elem.tag)
+        if tag in seen:
+            continue
+
+        # document ID (combined country + doc-number + kind)
+        if tag == "publication-reference":
+            pub_ref = elem.find("document-id")
+            if pub_ref is not None:
+                country = (pub_ref.findtext("country") or "").strip()
+                doc_num = (pub_ref.findtext("doc-number") or "").strip()
+                kind = (pub_ref.findtext("kind") or "").strip()
+                data["doc_id"] = f"{country}{doc_num}{kind}".strip()
+                seen.add(tag)
+        elif tag == "invention-title":
+            data["title"] = elem.text.strip() if elem.text else ""
+            seen.add(tag)
+        elif tag in ("abstract", "claims", "description"):
+            data[tag] = _joined_text(elem)
+            seen.add(tag)
 
     return data
 
 
-def process_directory(directory, record_tag, output_file):
+def iter_records(file_path, record_tag):
+    # Lazily parse every record in one XML file.
+    for xml_string in split_records(file_path, record_tag):
+        record = parse_record(xml_string, record_tag)
+        if record:
+            record["source_file"] = file_path
+            yield record
+
+def _drain_to_file(lines, path):
+    # Writer side of the pipeline: consume serialized lines until the None sentinel.
+    try:
+        with open(path, "wb", buffering=WRITE_BUFFER_SIZE) as out:
+            while True:
+                line = lines.get()
+                if line is None:
+                    return
+                out.write(line)
+    except Exception:
+        # keep draining so the parser never blocks on a full queue, then re-raise
+        while lines.get() is not None:
+            pass
+        raise
+
+def _parse_one_file(args):
+    # Worker: parse one XML file into its own jsonl file in tmp_dir.
+    # A writer thread drains a bounded queue so parsing overlaps with write I/O.
+    file_path, record_tag, tmp_dir = args
+    tmp_path = os.path.join(tmp_dir, os.path.basename(file_path) + ".jsonl")
+    lines = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    count = 0
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        done = writer.submit(_drain_to_file, lines, tmp_path)
+        try:
+            for record in iter_records(file_path, record_tag):
+                lines.put(_dumps(record) + b"\n")
+                count += 1
+        finally:
+            lines.put(None)
+        done.result()
+    return file_path, tmp_path, count
+
+
+def process_directory(directory, record_tag, output_file, processes=None):
     total_count = 0
-    with open(output_file, "w", encoding="utf-8") as out:
-        for file in os.listdir(directory):
-            if not file.endswith(".xml"):
-                continue
-            file_path = os.path.join(directory, file)
-            print(f"Parsing {file_path}")
-            count = 0
-            for xml_string in split_records(file_path, record_tag):
-                record = parse_record(xml_string, record_tag)
-                if record:
-                    record["source_file"] = file_path 
-                    out.write(json.dumps(record) + "\n")
-                    count += 1
-
-            total_count += count
-            print(f"Found {count} patents")
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    files = [os.path.join(directory, file) for file in sorted(os.listdir(directory)) if file.endswith(".xml")]
+
+    # XML parsing is CPU-bound and holds the GIL, so parse files in separate processes
+    # and concatenate the per-file outputs in file-name order, so repeated runs give
+    # identical output (and chunk ids) downstream.
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output_file) or ".") as tmp_dir:
+        tasks = [(file_path, record_tag, tmp_dir) for file_path in files]
+        with open(output_file, "wb", buffering=WRITE_BUFFER_SIZE) as out, Pool(processes=processes or os.cpu_count()) as pool:
+            for file_path, tmp_path, count in pool.imap(_parse_one_file, tasks, chunksize=1):
+                print(f"Parsed {file_path}: found {count} patents")
+                with open(tmp_path, "rb") as part:
+                    shutil.copyfileobj(part, out, WRITE_BUFFER_SIZE)
+                os.remove(tmp_path)
+                total_count += count
     print(f"Saved {total_count} patents to {output_file}")
 
 if __name__ == "__main__":
@@ -1,17 +1,35 @@
 import json
+import mmap
 import os
 import re
+from collections import deque
 from pathlib import Path
 import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
 from argparse import ArgumentParser
+from functools import lru_cache
+from multiprocessing import Pool
+
+# BlingFire's compiled tokenizer is much faster than NLTK's Treebank regexes
+try:
+    from blingfire import text_to_words
+
+    def word_tokenize(text):
+        return text_to_words(text).split(" ") if text else []
+except ImportError:
+    from nltk.tokenize import word_tokenize
+
+# orjson serializes straight to UTF-8 bytes; fall back to stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
 
 # nltk resources available + separate punkt and punkt_tab
 nltk.download("punkt", quiet=True)
 nltk.download("punkt_tab", quiet=True)
-nltk.download("stopwords", quiet=True)
 nltk.download("wordnet", quiet=True)
 nltk.download("omw-1.4", quiet=True)
 
@@ -19,85 +37,151 @@ nltk.download("omw-1.4", quiet=True)
 INPUT_DIR = Path("./data/processed")
 OUTPUT_FILE = INPUT_DIR / "chunks.jsonl"
 
-STOPWORDS = set(stopwords.words("english"))
+# NLTK's English stopword list, inlined so workers skip the corpus load
+STOPWORDS = frozenset({
+    "a", "about", "above", "after", "again", "against", "ain", "all", "am", "an",
+    "and", "any", "are", "aren", "aren't", "as", "at", "be", "because", "been",
+    "before", "being", "below", "between", "both", "but", "by", "can", "couldn",
+    "couldn't", "d", "did", "didn", "didn't", "do", "does", "doesn", "doesn't",
+    "doing", "don", "don't", "down", "during", "each", "few", "for", "from", "further",
+    "had", "hadn", "hadn't", "has", "hasn", "hasn't", "have", "haven", "haven't",
+    "having", "he", "her", "here", "hers", "herself", "him", "himself", "his", "how",
+    "i", "if", "in", "into", "is", "isn", "isn't", "it", "it's", "its", "itself",
+    "just", "ll", "m", "ma", "me", "mightn", "mightn't", "more", "most", "mustn",
+    "mustn't", "my", "myself", "needn", "needn't", "no", "nor", "not", "now", "o",
+    "of", "off", "on", "once", "only", "or", "other", "our", "ours", "ourselves",
+    "out", "over", "own", "re", "s", "same", "shan", "shan't", "she", "she's",
+    "should", "should've", "shouldn", "shouldn't", "so", "some", "such", "t", "than",
+    "that", "that'll", "the", "their", "theirs", "them", "themselves", "then", "there",
+    "these", "they", "this", "those", "through", "to", "too", "under", "until", "up",
+    "ve", "very", "was", "wasn", "wasn't", "we", "were", "weren", "weren't", "what",
+    "when", "where", "which", "while", "who", "whom", "why", "will", "with", "won",
+    "won't", "wouldn", "wouldn't", "y", "you", "you'd", "you'll", "you're", "you've",
+    "your", "yours", "yourself", "yourselves"
+})
+
 LEMMATIZER = WordNetLemmatizer()
 
 CHUNK_SIZE = 500 
 CHUNK_OVERLAP = 50 
 
+WRITE_BUFFER_SIZE = 1 << 20
+RANGE_SIZE = 8 << 20  # bytes of input JSONL per worker task
+IMAP_CHUNKSIZE = 2  # byte ranges handed to a worker at a time
+
+# A run of tags and/or whitespace collapses to one space, so one pass does both
+_RE_TAG_OR_WS = re.compile(r"(?:<[^>]+>|\s)+")
+
 def clean_text(text):
-    # strip and collapse whitespace
+    # strip tags and collapse whitespace (callers lowercase the combined text once)
     if not text:
         return ""
-    
-    # Memory-efficient processing for very large texts
-    if len(text) > 1000000:  # 1MB threshold
-        # Process in chunks to avoid memory issues
-        chunks = []
-        chunk_size = 100000  # 100KB chunks
-        for i in range(0, len(text), chunk_size):
-            chunk = text[i:i + chunk_size]
-            chunk = re.sub(r"<[^>]+>", " ", chunk)
-            chunk = re.sub(r"\s+", " ", chunk)
-            chunks.append(chunk.lower())
-        text = "".join(chunks)
-    else:
-        # Normal processing for smaller texts
-        text = re.sub(r"<[^>]+>", " ", text)  
-        text = re.sub(r"\s+", " ", text)     
-        text = text.lower()
-    
-    return text.strip()
+    return _RE_TAG_OR_WS.sub(" ", text).strip()
 
-def tokenize_and_filter(text):
-    tokens = word_tokenize(text)
-    filtered = []
-    for token in tokens:
-        if not token.isalnum():
-            continue
-        if any(ch.isdigit() for ch in token):
-            continue
-        if len(token) < 3:
-            continue
-        if token in STOPWORDS:
+@lru_cache(maxsize=200_000)
+def _lemma(token):
+    # patent vocabularies are Zipfian, so most lookups repeat
+    return LEMMATIZER.lemmatize(token)
+
+def iter_filtered_tokens(text):
+    # lazily yield lemmatized content tokens
+    for token in word_tokenize(text):
+        # isalpha() rejects digits, punctuation and underscores in one C call
+        if len(token) < 3 or not token.isalpha() or token in STOPWORDS:
             continue
-        lemma = LEMMATIZER.lemmatize(token)
-        filtered.append(lemma)
-    return filtered
+        yield _lemma(token)
+
+def tokenize_and_filter(text):
+    return list(iter_filtered_tokens(text))
 
 def chunk_tokens(tokens, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    # yield overlapping chunks
-    start = 0
-    while start < len(tokens):
-        end = min(start + chunk_size, len(tokens))
-        yield tokens[start:end]
-        if end == len(tokens):
-            break
-        start = end - overlap 
-
-def process_file(input_file, out_file, mode="chunks", chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    with open(input_file, "r", encoding="utf-8") as f:
-        for line in f:
-            patent = json.loads(line)
-            combined_text = " ".join([
-                clean_text(patent.get("title", "")),
-                clean_text(patent.get("abstract", "")),
-                clean_text(patent.get("claims", "")),
-                clean_text(patent.get("description", "")),
-            ])
-            tokens = tokenize_and_filter(combined_text)
-            if mode == "doc":
-                out_file.write(json.dumps({
-                    "doc_id": patent.get("doc_id"),
-                    "text": " ".join(tokens)
-                }) + "\n")
-            else:
-                for i, chunk in enumerate(chunk_tokens(tokens, chunk_size=chunk_size, overlap=overlap)):
-                    out_file.write(json.dumps({
-                        "doc_id": patent.get("doc_id"),
-                        "chunk_id": f"{patent.get('doc_id')}_chunk{i}",
-                        "text": " ".join(chunk)
-                    }) + "\n")
+    # yield overlapping chunks as joined text, reading tokens from any iterable
+    window = deque()
+    step = max(1, chunk_size - overlap)
+    fresh = 0  # tokens added since the last chunk was emitted
+    for token in tokens:
+        window.append(token)
+        fresh += 1
+        if len(window) == chunk_size:
+            yield " ".join(window)
+            for _ in range(step):
+                window.popleft()
+            fresh = 0
+    if fresh:
+        yield " ".join(window)
+
+def _process_record(line, mode="chunks", chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    # clean, tokenize and chunk one patent; returns its output JSON lines as bytes
+    patent = json.loads(line)
+    combined_text = " ".join([
+        clean_text(patent.get("title", "")),
+        clean_text(patent.get("abstract", "")),
+        clean_text(patent.get("claims", "")),
+        clean_text(patent.get("description", "")),
+    ]).lower()
+    tokens = iter_filtered_tokens(combined_text)
+    if mode == "doc":
+        return [_dumps({
+            "doc_id": patent.get("doc_id"),
+            "text": " ".join(tokens)
+        }) + b"\n"]
+    return [
+        _dumps({
+            "doc_id": patent.get("doc_id"),
+            "chunk_id": f"{patent.get('doc_id')}_chunk{i}",
+            "text": chunk
+        }) + b"\n"
+        for i, chunk in enumerate(chunk_tokens(tokens, chunk_size=chunk_size, overlap=overlap))
+    ]
+
+def _split_ranges(path, range_size=RANGE_SIZE):
+    # byte ranges of about range_size, each ending just after a newline
+    ranges = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ranges
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = mm.find(b"\n", min(start + range_size, size) - 1)
+                end = size if end == -1 else end + 1
+                ranges.append((start, end))
+                start = end
+    return ranges
+
+def _process_range(args):
+    # worker: map the input file and process every record in one byte range
+    path, start, end, mode, chunk_size, overlap = args
+    out = bytearray()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            nl = mm.find(b"\n", pos, end)
+            line_end = end if nl == -1 else nl
+            line = mm[pos:line_end]
+            pos = line_end + 1
+            if line.strip():
+                for record_line in _process_record(line, mode=mode, chunk_size=chunk_size, overlap=overlap):
+                    out += record_line
+    return bytes(out)
+
+def process_file(input_file, out_file, mode="chunks", chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, processes=None):
+    # patents are independent, so workers each take a newline-aligned byte range
+    # of the memory-mapped input; out_file must be opened in binary mode.
+    # Results are written in input order so repeated runs give identical output.
+    tasks = [(str(input_file), start, end, mode, chunk_size, overlap)
+             for start, end in _split_ranges(input_file)]
+    buf = bytearray()
+    with Pool(processes=processes or os.cpu_count()) as pool:
+        for lines in pool.imap(_process_range, tasks, chunksize=IMAP_CHUNKSIZE):
+            buf += lines
+            # flush in ~1 MiB writes
+            if len(buf) >= WRITE_BUFFER_SIZE:
+                out_file.write(buf)
+                buf.clear()
+    if buf:
+        out_file.write(buf)
 
 if __name__ == "__main__":
     parser = ArgumentParser(description="Preprocess patents: tokenize, clean, and chunk text")
@@ -106,7 +190,7 @@ if __name__ == "__main__":
     parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="Token overlap between chunks")
     args = parser.parse_args()
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
+    with open(OUTPUT_FILE, "wb") as out:
         for fname in ["grants.jsonl", "applications.jsonl"]:
             input_file = INPUT_DIR / fname
             if input_file.exists():
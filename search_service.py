@@ -4,23 +4,29 @@ Centralized search service for Patent NLP Project.
 This module consolidates all search logic to be shared between CLI and API.
 """
 
+import os
+import threading
 import time
 from typing import List, Dict, Any, Tuple, Optional
 from pathlib import Path
 
 # Import search functions
-from embed_tfidf import search as search_tfidf, search_with_metadata as search_tfidf_with_metadata
-from embed_semantic import search_semantic
+from embed_tfidf import search as search_tfidf, search_with_metadata as search_tfidf_with_metadata, TFIDF_DIR
+from embed_semantic import search_semantic, SEMANTIC_DIR
 from embed_hybrid import search_hybrid, search_hybrid_advanced
-from search_utils import generate_snippet, log_query, load_patent_metadata
+from search_utils import generate_snippet, log_query, load_patent_metadata, get_chunk_texts, CHUNKS_FILE
+from cachetools import LRUCache
+import numpy as np
 
 # Import optimized search functions
 try:
     from optimized_search_service import (
+        optimized_tfidf_search,
         optimized_tfidf_search_with_metadata,
         optimized_semantic_search,
         optimized_hybrid_search,
         optimized_hybrid_advanced_search,
+        embed_query,
         warm_up_caches
     )
     OPTIMIZED_AVAILABLE = True
@@ -28,8 +34,82 @@ except ImportError:
     OPTIMIZED_AVAILABLE = False
 
 
+# Results of recent searches keyed on every parameter that affects them
+RESULT_CACHE_SIZE = 512
+_result_cache = LRUCache(maxsize=RESULT_CACHE_SIZE)
+_result_cache_lock = threading.Lock()
+
+# Rebuilding any of these changes the index version, so older cache entries stop matching
+INDEX_FILES = (TFIDF_DIR / "matrix.npz", SEMANTIC_DIR / "faiss_index.bin", CHUNKS_FILE)
+
+
+def _index_version() -> Tuple[int, ...]:
+    """mtimes of the index files (0 for missing ones)."""
+    version = []
+    for path in INDEX_FILES:
+        try:
+            version.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            version.append(0)
+    return tuple(version)
+
+# Paraphrased queries whose embedding is at least this similar reuse cached results
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = 256
+# Only pure semantic search without rerank: it embeds the query anyway, and unlike
+# the hybrid modes and keyword rerank its ranking has no exact-term component
+SEMANTIC_CACHE_MODES = ("semantic",)
+
+
+class _SemanticResultCache:
+    """Fixed-size ring of query embeddings and their results, matched by cosine similarity."""
+    
+    def __init__(self, size: int, threshold: float):
+        self.size = size
+        self.threshold = threshold
+        self._embeddings = None  # float32 [size, dim], rows are unit vectors
+        self._entries = [None] * size  # (params, results) per row
+        self._count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+    
+    def get(self, params: tuple, embedding) -> Optional[tuple]:
+        with self._lock:
+            if not self._count:
+                return None
+            scores = self._embeddings[:self._count] @ embedding.ravel()
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for row in candidates[np.argsort(-scores[candidates])]:
+                entry_params, results = self._entries[row]
+                if entry_params == params:
+                    return results
+        return None
+    
+    def put(self, params: tuple, embedding, results: tuple) -> None:
+        embedding = embedding.ravel()
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.size, embedding.shape[0]), dtype=np.float32)
+            self._embeddings[self._next] = embedding
+            self._entries[self._next] = (params, results)
+            self._next = (self._next + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+
+
+_semantic_result_cache = _SemanticResultCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD)
+
+
+def _canonicalize(query: str) -> str:
+    """Lowercased, whitespace-collapsed query, so case and spacing variants share cache entries."""
+    # Punctuation is kept: "C++ compiler" and "C# compiler" must not collide
+    return ' '.join(query.lower().split())
+
+
 class SearchRequest:
     """Search request parameters."""
+    __slots__ = ("query", "canonical_query", "mode", "top_k", "alpha", "tfidf_weight",
+                 "semantic_weight", "rerank", "include_snippets", "include_metadata", "log_enabled")
+    
     def __init__(self, 
                  query: str,
                  mode: str = "tfidf",
@@ -42,6 +122,7 @@ class SearchRequest:
                  include_metadata: bool = True,
                  log_enabled: bool = False):
         self.query = query
+        self.canonical_query = _canonicalize(query) if query else ""
         self.mode = mode
         self.top_k = top_k
         self.alpha = alpha
@@ -55,6 +136,8 @@ class SearchRequest:
 
 class SearchResult:
     """Standardized search result format."""
+    __slots__ = ("doc_id", "score", "title", "doc_type", "source_file", "snippet", "base_doc_id")
+    
     def __init__(self, 
                  doc_id: str,
                  score: float,
@@ -84,6 +167,25 @@ class SearchResult:
         }
 
 
+def _uses_semantic_cache(request: SearchRequest) -> bool:
+    """Whether a paraphrase of this request may share its results."""
+    return request.mode in SEMANTIC_CACHE_MODES and not request.rerank
+
+
+def _cache_key(request: SearchRequest) -> tuple:
+    """Result-cache key: every parameter that changes the output, plus the index version."""
+    return (request.canonical_query, request.mode, request.top_k, request.alpha,
+            request.tfidf_weight, request.semantic_weight, request.rerank,
+            request.include_snippets, request.include_metadata, _index_version())
+
+
+def is_cached(request: SearchRequest) -> bool:
+    """Whether run_search would answer this request from the exact-match result cache."""
+    key = _cache_key(request)
+    with _result_cache_lock:
+        return key in _result_cache
+
+
 def run_search(request: SearchRequest) -> Tuple[List[SearchResult], Dict[str, Any]]:
     """
     Centralized search function that handles all search modes and features.
@@ -118,6 +220,71 @@ def run_search(request: SearchRequest) -> Tuple[List[SearchResult], Dict[str, An
     if request.mode == "hybrid" and (request.alpha < 0 or request.alpha > 1):
         raise ValueError("alpha must be between 0 and 1 for hybrid mode")
     
+    # Serve repeated queries from memory; the pipeline only runs on a miss
+    cache_key = _cache_key(request)
+    with _result_cache_lock:
+        cached = _result_cache.get(cache_key)
+    
+    # On an exact miss, look for a cached paraphrase of the query
+    query_embedding = None
+    paraphrase_hit = False
+    if cached is None and OPTIMIZED_AVAILABLE and _uses_semantic_cache(request):
+        try:
+            query_embedding = embed_query(request.query)
+        except Exception as e:
+            print(f"Semantic cache lookup skipped: {e}")
+        if query_embedding is not None:
+            cached = _semantic_result_cache.get(cache_key[1:], query_embedding)
+            paraphrase_hit = cached is not None
+    
+    if cached is not None:
+        results = [SearchResult(**result) for result in cached]
+        if paraphrase_hit and request.include_snippets:
+            # Cached snippets highlight the other query's terms; rebuild them for this one
+            texts = get_chunk_texts([result.doc_id for result in results])
+            for result in results:
+                text = texts.get(result.doc_id)
+                result.snippet = generate_snippet(text, request.query) if text else ""
+    else:
+        results = _execute_search(request)
+        # The search backends return [] on errors (e.g. an index still loading), so
+        # only non-empty results are cached
+        if results:
+            cached = tuple(result.to_dict() for result in results)
+            with _result_cache_lock:
+                _result_cache[cache_key] = cached
+            if query_embedding is not None:
+                _semantic_result_cache.put(cache_key[1:], query_embedding, cached)
+    
+    # Log query if enabled
+    if request.log_enabled:
+        log_query(request.query, request.mode, [(r.doc_id, r.score) for r in results])
+    
+    # Calculate timing
+    search_time = time.time() - start_time
+    
+    # Prepare metadata
+    metadata = {
+        "search_time": search_time,
+        "mode": request.mode,
+        "total_results": len(results),
+        "query": request.query
+    }
+    
+    return results, metadata
+
+
+def _execute_search(request: SearchRequest) -> List[SearchResult]:
+    """Run the retrieval pipeline for a validated request."""
+    # Callers that only want ids and scores skip metadata, snippets and chunk text
+    lean = not request.include_snippets and not request.include_metadata
+    if lean and request.mode == "tfidf":
+        if OPTIMIZED_AVAILABLE:
+            raw_results = optimized_tfidf_search(request.query, top_k=request.top_k)
+        else:
+            raw_results = search_tfidf(request.query, top_k=request.top_k)
+        return [SearchResult(doc_id=doc_id, score=score) for doc_id, score in raw_results]
+    
     # Run search based on mode (use optimized versions if available)
     if request.mode == "tfidf":
         if OPTIMIZED_AVAILABLE:
@@ -179,8 +346,13 @@ def run_search(request: SearchRequest) -> Tuple[List[SearchResult], Dict[str, An
                 semantic_weight=request.semantic_weight
             )
     
-    # Convert raw results to standardized format
+    if lean:
+        return [SearchResult(doc_id=item[0], score=item[1]) for item in raw_results]
+    
+    # Convert raw results to standardized format; base_doc_id, title and doc_type
+    # are resolved here once so formatters only read attributes
     results = []
+    patent_metadata = None
     for item in raw_results:
         if len(item) == 3:  # (doc_id, score, metadata)
             doc_id, score, meta = item
@@ -190,11 +362,22 @@ def run_search(request: SearchRequest) -> Tuple[List[SearchResult], Dict[str, An
                 title=meta.get("title", ""),
                 doc_type=meta.get("doc_type", ""),
                 source_file=meta.get("source_file", ""),
-                base_doc_id=meta.get("base_doc_id", "")
+                base_doc_id=meta.get("base_doc_id") or doc_id.partition('_chunk')[0]
             )
         else:  # (doc_id, score) - fallback for basic results
             doc_id, score = item
-            result = SearchResult(doc_id=doc_id, score=score)
+            base_doc_id = doc_id.partition('_chunk')[0]
+            if patent_metadata is None:
+                patent_metadata = load_patent_metadata()
+            base_meta = patent_metadata.get(base_doc_id, {})
+            result = SearchResult(
+                doc_id=doc_id,
+                score=score,
+                title=base_meta.get("title", ""),
+                doc_type=base_meta.get("doc_type", ""),
+                source_file=base_meta.get("source_file", ""),
+                base_doc_id=base_doc_id
+            )
         
         # Generate snippet if requested
         if request.include_snippets:
@@ -204,22 +387,7 @@ def run_search(request: SearchRequest) -> Tuple[List[SearchResult], Dict[str, An
         
         results.append(result)
     
-    # Log query if enabled
-    if request.log_enabled:
-        log_query(request.query, request.mode, [(r.doc_id, r.score) for r in results])
-    
-    # Calculate timing
-    search_time = time.time() - start_time
-    
-    # Prepare metadata
-    metadata = {
-        "search_time": search_time,
-        "mode": request.mode,
-        "total_results": len(results),
-        "query": request.query
-    }
-    
-    return results, metadata
+    return results
 
 
 def format_results_for_cli(results: List[SearchResult], mode_name: str, query: str = "") -> None:
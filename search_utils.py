@@ -1,35 +1,91 @@
 #!/usr/bin/env python3
 # Utility functions for search result enrichment and formatting.
 
+import atexit
+import hashlib
+import heapq
 import json
+import mmap
+import os
+import pickle
+import queue
 import re
+import threading
+import time
+from bisect import bisect_right
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Optional
+from typing import AbstractSet, Iterable, List, Dict, Any, Tuple, Optional
 from collections import defaultdict
+from functools import lru_cache, partial
 
+import numpy as np
+from scipy import sparse
 
-def load_patent_metadata() -> Dict[str, Dict[str, Any]]:
-    # Load patent metadata from grants.jsonl and applications.jsonl
+# orjson parses and serializes straight from/to UTF-8 bytes; fall back to stdlib json
+try:
+    import orjson
+    _loads = orjson.loads
+    # Scores may arrive as NumPy scalars
+    _dumps = partial(orjson.dumps, option=orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    _loads = json.loads
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+_WORD_RE = re.compile(r'\b\w+\b')
+# Chunk ids are "<doc_id>_chunk<n>"
+_CHUNK_SPLIT = '_chunk'
+
+
+METADATA_DIR = Path("./data/processed")
+METADATA_FILES = ("grants.jsonl", "applications.jsonl")
+
+
+def _metadata_file_stats() -> Tuple[Tuple[str, int, int], ...]:
+    # (path, mtime, size) for each metadata file that exists; changes whenever a file is rewritten
+    stats = []
+    for file_name in METADATA_FILES:
+        full_path = METADATA_DIR / file_name
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            continue
+        stats.append((str(full_path), stat.st_mtime_ns, stat.st_size))
+    return tuple(stats)
+
+
+@lru_cache(maxsize=4)
+def _load_patent_metadata(file_stats: Tuple[Tuple[str, int, int], ...]) -> Dict[str, Dict[str, Any]]:
     metadata = {}
     
-    for file_path in ["grants.jsonl", "applications.jsonl"]:
-        full_path = Path("./data/processed") / file_path
-        if full_path.exists():
-            with open(full_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    patent = json.loads(line)
-                    doc_id = patent.get("doc_id")
-                    if doc_id:
-                        metadata[doc_id] = {
-                            "title": patent.get("title", ""),
-                            "abstract": patent.get("abstract", ""),
-                            "source_file": patent.get("source_file", ""),
-                            "doc_type": "grant" if "grant" in file_path else "application"
-                        }
+    for file_path, _, _ in file_stats:
+        with open(file_path, "rb") as f:
+            for line in f:
+                patent = _loads(line)
+                doc_id = patent.get("doc_id")
+                if doc_id:
+                    metadata[doc_id] = {
+                        "title": patent.get("title", ""),
+                        "abstract": patent.get("abstract", ""),
+                        "source_file": patent.get("source_file", ""),
+                        "doc_type": "grant" if "grant" in Path(file_path).name else "application"
+                    }
     
     return metadata
 
 
+def load_patent_metadata() -> Dict[str, Dict[str, Any]]:
+    # Load patent metadata from grants.jsonl and applications.jsonl
+    # Memoized on the files' (path, mtime, size); callers share the dict and must not mutate it
+    return _load_patent_metadata(_metadata_file_stats())
+
+
+@lru_cache(maxsize=256)
+def _query_term_pattern(terms: Tuple[str, ...]) -> "re.Pattern":
+    # Whole-word, case-insensitive alternation of the query terms, longest first
+    return re.compile(r'\b(?:' + '|'.join(re.escape(t) for t in terms) + r')\b', re.IGNORECASE)
+
+
 def generate_snippet(text: str, query: str, max_length: int = 200) -> str:
     """
     Generate a snippet from text, highlighting query terms.
@@ -46,29 +102,31 @@ def generate_snippet(text: str, query: str, max_length: int = 200) -> str:
         return text[:max_length] + "..." if len(text) > max_length else text
     
     # Clean and tokenize query
-    query_terms = re.findall(r'\b\w+\b', query.lower())
+    query_terms = _WORD_RE.findall(query.lower())
+    long_terms = tuple(sorted({term for term in query_terms if len(term) > 2}, key=len, reverse=True))
     
-    # Find the best position to start the snippet
-    # Memory-efficient: only lowercase the snippet window, not the entire text
+    # One alternation finds every term occurrence in a single pass over the text
+    pattern = None
     best_start = 0
-    max_matches = 0
-    
-    # Look for positions with most query term matches
-    for i in range(0, len(text) - max_length + 1, 50):  # Check every 50 chars
-        snippet_text = text[i:i + max_length].lower()  # Only lowercase the snippet window
-        matches = sum(1 for term in query_terms if term in snippet_text)
-        if matches > max_matches:
-            max_matches = matches
-            best_start = i
+    if long_terms:
+        pattern = _query_term_pattern(long_terms)
+        hits = [m.start() for m in pattern.finditer(text)]
+        
+        # Start the window at the hit with the most hits inside it
+        max_matches = 0
+        for i, hit in enumerate(hits):
+            matches = bisect_right(hits, hit + max_length - 1, i) - i
+            if matches > max_matches:
+                max_matches = matches
+                best_start = hit
+        best_start = min(best_start, max(0, len(text) - max_length))
     
     # Extract snippet
     snippet = text[best_start:best_start + max_length]
     
     # Highlight query terms
-    for term in query_terms:
-        if len(term) > 2:  # Only highlight terms longer than 2 chars
-            pattern = re.compile(re.escape(term), re.IGNORECASE)
-            snippet = pattern.sub(f"**{term}**", snippet)
+    if pattern is not None:
+        snippet = pattern.sub(lambda m: f"**{m.group(0)}**", snippet)
     
     # Add ellipsis if needed
     if best_start > 0:
@@ -97,7 +155,7 @@ def format_search_result(result: Tuple[str, float], metadata: Dict[str, Dict[str
     meta = metadata.get(doc_id, {})
     
     # Extract base doc_id (remove chunk suffix)
-    base_doc_id = doc_id.split('_chunk')[0] if '_chunk' in doc_id else doc_id
+    base_doc_id = doc_id.partition(_CHUNK_SPLIT)[0]
     
     # Get metadata for base document
     base_meta = metadata.get(base_doc_id, meta)
@@ -120,18 +178,198 @@ def format_search_result(result: Tuple[str, float], metadata: Dict[str, Dict[str
     return "\n".join(lines)
 
 
+CHUNKS_FILE = Path("./data/processed/chunks.jsonl")
+CHUNK_INDEX_FILE = CHUNKS_FILE.with_name("chunks.idx.pkl")
+
+# chunk_id -> byte offset of its line in chunks.jsonl, keyed on the file's (mtime, size)
+_chunk_index: Optional[Dict[str, int]] = None
+_chunk_index_key: Optional[Tuple[int, int]] = None
+_chunk_index_lock = threading.Lock()
+
+
+_CHUNK_ID_RE = re.compile(rb'"chunk_id"\s*:\s*"([^"\\]*)"')
+
+
+def _build_chunk_index() -> Dict[str, int]:
+    # One pass over chunks.jsonl recording where each chunk's line starts.
+    # Scans the memory-mapped file for newlines and pulls out only the chunk_id;
+    # lines whose id the regex can't read (escapes) fall back to a full parse.
+    index = {}
+    with open(CHUNKS_FILE, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return index
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            pos = 0
+            size = len(mm)
+            while pos < size:
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    end = size
+                match = _CHUNK_ID_RE.search(mm, pos, end)
+                if match is not None:
+                    index[match.group(1).decode("utf-8")] = pos
+                elif end > pos:
+                    chunk_id = _loads(mm[pos:end]).get("chunk_id")
+                    if chunk_id is not None:
+                        index[chunk_id] = pos
+                pos = end + 1
+    return index
+
+
+def _get_chunk_index() -> Optional[Dict[str, int]]:
+    # Load the offset index from memory, then the pickle next to chunks.jsonl, then by scanning
+    global _chunk_index, _chunk_index_key
+    if not CHUNKS_FILE.exists():
+        return None
+    stat = CHUNKS_FILE.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    if _chunk_index is not None and _chunk_index_key == key:
+        return _chunk_index
+    
+    with _chunk_index_lock:
+        if _chunk_index is not None and _chunk_index_key == key:
+            return _chunk_index
+        
+        index = None
+        try:
+            with open(CHUNK_INDEX_FILE, "rb") as f:
+                stored_key, stored_index = pickle.load(f)
+            if stored_key == key:
+                index = stored_index
+        except Exception:
+            pass
+        
+        if index is None:
+            index = _build_chunk_index()
+            try:
+                with open(CHUNK_INDEX_FILE, "wb") as f:
+                    pickle.dump((key, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError:
+                pass
+        
+        _chunk_index, _chunk_index_key = index, key
+        return index
+
+
 def get_chunk_text(chunk_id: str) -> Optional[str]:
     # Get the text content for a chunk ID
-    chunks_file = Path("./data/processed/chunks.jsonl")
-    if not chunks_file.exists():
+    return get_chunk_texts([chunk_id])[chunk_id]
+
+
+def get_chunk_texts(chunk_ids: List[str]) -> Dict[str, Optional[str]]:
+    # Get the text for many chunk IDs with one seek + readline each
+    texts: Dict[str, Optional[str]] = {chunk_id: None for chunk_id in chunk_ids}
+    index = _get_chunk_index() if texts else None
+    if not index:
+        return texts
+    
+    # Read in file order so seeks move forward
+    located = sorted((index[chunk_id], chunk_id) for chunk_id in texts if chunk_id in index)
+    if not located:
+        return texts
+    with open(CHUNKS_FILE, "rb") as f:
+        for offset, chunk_id in located:
+            f.seek(offset)
+            texts[chunk_id] = _loads(f.readline()).get("text", "")
+    return texts
+
+
+TOKEN_INDEX_FILE = CHUNKS_FILE.with_name("chunks.tokens.pkl")
+TOKEN_MATRIX_FILE = CHUNKS_FILE.with_name("chunks.tokens.npz")
+KEYWORD_TOKEN_PATTERN = r'\b\w\w\w+\b'
+
+# (presence matrix, row token counts, chunk_id -> row, token -> column), keyed on
+# chunks.jsonl's (mtime, size) like the offset index
+_token_index: Optional[Tuple[Any, np.ndarray, Dict[str, int], Dict[str, int]]] = None
+_token_index_key: Optional[Tuple[int, int]] = None
+_token_index_lock = threading.Lock()
+_token_index_warned_key: Optional[Tuple[int, int]] = None
+
+
+def _keyword_tokens(text: str) -> set:
+    # Lowercased word tokens longer than 2 chars, as used for keyword overlap
+    return {token for token in _WORD_RE.findall(text.lower()) if len(token) > 2}
+
+
+def build_token_index() -> None:
+    # Tokenize every chunk once into a binary chunk x vocab CSR matrix for reranking
+    from sklearn.feature_extraction.text import CountVectorizer
+    global _token_index, _token_index_key
+    stat = CHUNKS_FILE.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    
+    rows = {}
+    
+    def iter_texts():
+        with open(CHUNKS_FILE, "rb") as f:
+            for line in f:
+                chunk = _loads(line)
+                chunk_id = chunk.get("chunk_id")
+                text = chunk.get("text", "")
+                # Empty chunks stay out so rerank keeps treating them as having no text
+                if chunk_id is not None and text:
+                    rows[chunk_id] = len(rows)
+                    yield text
+    
+    vectorizer = CountVectorizer(binary=True, token_pattern=KEYWORD_TOKEN_PATTERN, dtype=np.uint8)
+    matrix = vectorizer.fit_transform(iter_texts()).tocsr()
+    vocabulary = {token: int(col) for token, col in vectorizer.vocabulary_.items()}
+    
+    sparse.save_npz(TOKEN_MATRIX_FILE, matrix)
+    with open(TOKEN_INDEX_FILE, "wb") as f:
+        pickle.dump((key, rows, vocabulary), f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    with _token_index_lock:
+        _token_index = (matrix, matrix.getnnz(axis=1), rows, vocabulary)
+        _token_index_key = key
+
+
+def _warn_token_index_fallback(key: Tuple[int, int], reason: Exception) -> None:
+    # Called under _token_index_lock; reported once per chunks.jsonl version
+    global _token_index_warned_key
+    if _token_index_warned_key != key:
+        _token_index_warned_key = key
+        print(f"Rerank token index unavailable ({reason}); tokenizing chunk texts per query. "
+              f"Run 'python embed_tfidf.py build' to rebuild it.")
+
+
+def _get_token_index() -> Optional[Tuple[Any, np.ndarray, Dict[str, int], Dict[str, int]]]:
+    # Load the matrix built by build_token_index; None if missing or stale
+    global _token_index, _token_index_key
+    if not CHUNKS_FILE.exists():
         return None
-    
-    with open(chunks_file, "r", encoding="utf-8") as f:
-        for line in f:
-            chunk_data = json.loads(line)
-            if chunk_data.get("chunk_id") == chunk_id:
-                return chunk_data.get("text", "")
-    return None
+    stat = CHUNKS_FILE.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    if _token_index is not None and _token_index_key == key:
+        return _token_index
+    
+    with _token_index_lock:
+        if _token_index is not None and _token_index_key == key:
+            return _token_index
+        try:
+            with open(TOKEN_INDEX_FILE, "rb") as f:
+                stored_key, rows, vocabulary = pickle.load(f)
+            if stored_key != key:
+                raise ValueError(f"{TOKEN_INDEX_FILE} is older than {CHUNKS_FILE}")
+            matrix = sparse.load_npz(TOKEN_MATRIX_FILE).tocsr()
+        except Exception as e:
+            _warn_token_index_fallback(key, e)
+            return None
+        _token_index = (matrix, matrix.getnnz(axis=1), rows, vocabulary)
+        _token_index_key = key
+        return _token_index
+
+
+def _token_overlap(text_tokens: AbstractSet[str], query_tokens: AbstractSet[str]) -> float:
+    # Jaccard similarity of two token sets
+    if not query_tokens:
+        return 0.0
+    intersection = len(text_tokens & query_tokens)
+    # |A ∪ B| = |A| + |B| - |A ∩ B|, without building the union set
+    union = len(text_tokens) + len(query_tokens) - intersection
+    return intersection / union if union > 0 else 0.0
 
 
 def compute_keyword_overlap_score(text: str, query: str) -> float:
@@ -154,29 +392,16 @@ def compute_keyword_overlap_score(text: str, query: str) -> float:
         text_tokens = set()
         chunk_size = 100000
         for i in range(0, len(text), chunk_size):
-            chunk = text[i:i + chunk_size].lower()
-            text_tokens.update(re.findall(r'\b\w+\b', chunk))
+            text_tokens.update(_keyword_tokens(text[i:i + chunk_size]))
     else:
-        text_tokens = set(re.findall(r'\b\w+\b', text.lower()))
-    
-    query_tokens = set(re.findall(r'\b\w+\b', query.lower()))
-    
-    # Remove very short tokens
-    text_tokens = {token for token in text_tokens if len(token) > 2}
-    query_tokens = {token for token in query_tokens if len(token) > 2}
+        text_tokens = _keyword_tokens(text)
     
-    if not query_tokens:
-        return 0.0
-    
-    # Compute Jaccard similarity
-    intersection = len(text_tokens & query_tokens)
-    union = len(text_tokens | query_tokens)
-    
-    return intersection / union if union > 0 else 0.0
+    return _token_overlap(text_tokens, _keyword_tokens(query))
 
 
 def rerank_results(results: List[Tuple[str, float]], query: str, 
-                  keyword_weight: float = 0.3, semantic_weight: float = 0.7) -> List[Tuple[str, float]]:
+                  keyword_weight: float = 0.3, semantic_weight: float = 0.7,
+                  top_k: Optional[int] = None) -> List[Tuple[str, float]]:
     """
     Re-rank results by combining semantic scores with keyword overlap.
     
@@ -185,6 +410,7 @@ def rerank_results(results: List[Tuple[str, float]], query: str,
         query: Search query
         keyword_weight: Weight for keyword overlap score
         semantic_weight: Weight for semantic score
+        top_k: Number of best results to keep (all if None)
     
     Returns:
         Re-ranked list of (doc_id, score) tuples
@@ -192,17 +418,36 @@ def rerank_results(results: List[Tuple[str, float]], query: str,
     if not results or not query:
         return results
     
+    # Keyword scores for chunks in the token matrix come from one sparse product;
+    # only chunks missing from it have their text fetched and tokenized
+    query_tokens = _keyword_tokens(query)
+    keyword_scores = {}
+    token_index = _get_token_index()
+    if token_index is not None:
+        matrix, row_sums, rows, vocabulary = token_index
+        indexed = [doc_id for doc_id, _ in results if doc_id in rows]
+        if indexed:
+            row_ids = np.fromiter((rows[doc_id] for doc_id in indexed), dtype=np.int64, count=len(indexed))
+            query_vec = np.zeros(matrix.shape[1], dtype=np.int32)
+            query_vec[[vocabulary[token] for token in query_tokens if token in vocabulary]] = 1
+            inter = matrix[row_ids] @ query_vec
+            union = row_sums[row_ids] + len(query_tokens) - inter
+            jaccard = np.divide(inter, union, out=np.zeros(len(indexed)), where=union > 0)
+            keyword_scores = dict(zip(indexed, jaccard.tolist()))
+    
+    missing = [doc_id for doc_id, _ in results if doc_id not in keyword_scores]
+    texts = get_chunk_texts(missing) if missing else {}
+    
     reranked = []
     
     for doc_id, semantic_score in results:
-        # Get text for keyword analysis
-        text = get_chunk_text(doc_id)
-        if not text:
-            reranked.append((doc_id, semantic_score))
-            continue
-        
-        # Compute keyword overlap score
-        keyword_score = compute_keyword_overlap_score(text, query)
+        keyword_score = keyword_scores.get(doc_id)
+        if keyword_score is None:
+            text = texts.get(doc_id)
+            if not text:
+                reranked.append((doc_id, semantic_score))
+                continue
+            keyword_score = compute_keyword_overlap_score(text, query)
         
         # Combine scores
         combined_score = (semantic_weight * semantic_score + 
@@ -210,17 +455,143 @@ def rerank_results(results: List[Tuple[str, float]], query: str,
         
         reranked.append((doc_id, combined_score))
     
-    # Sort by combined score
+    # Sort by combined score, selecting only the top k when given
+    if top_k is not None:
+        return heapq.nlargest(top_k, reranked, key=lambda x: x[1])
     reranked.sort(key=lambda x: x[1], reverse=True)
     
     return reranked
 
 
+FUSION_METHODS = ("combsum", "combmnz")
+
+
+def fuse_scores(tfidf_hits: Iterable[Tuple[str, float]], semantic_hits: Iterable[Tuple[str, float]],
+                tfidf_weight: float, semantic_weight: float, top_k: Optional[int] = None,
+                method: str = "combsum") -> List[Tuple[str, float]]:
+    """
+    Fuse two ranked lists into one, best first.
+    
+    CombSUM scores each doc by the weighted sum of its scores (0 where a list
+    missed it); CombMNZ additionally multiplies by the number of lists that
+    found it.
+    
+    Args:
+        tfidf_hits: List of (doc_id, score) tuples from TF-IDF search
+        semantic_hits: List of (doc_id, score) tuples from semantic search
+        tfidf_weight: Weight for TF-IDF scores
+        semantic_weight: Weight for semantic scores
+        top_k: Number of results to keep (all if None)
+        method: "combsum" or "combmnz"
+    
+    Returns:
+        List of (doc_id, fused_score) tuples
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Invalid fusion method: {method}. Must be one of {list(FUSION_METHODS)}")
+    
+    # doc_id -> [tfidf score, semantic score, found by tfidf, found by semantic]
+    scores: Dict[str, List[float]] = {}
+    for doc_id, score in tfidf_hits:
+        entry = scores.setdefault(doc_id, [0.0, 0.0, 0, 0])
+        entry[0] = score
+        entry[2] = 1
+    for doc_id, score in semantic_hits:
+        entry = scores.setdefault(doc_id, [0.0, 0.0, 0, 0])
+        entry[1] = score
+        entry[3] = 1
+    
+    if method == "combmnz":
+        def fused(entry):
+            return (tfidf_weight * entry[0] + semantic_weight * entry[1]) * (entry[2] + entry[3])
+    else:
+        def fused(entry):
+            return tfidf_weight * entry[0] + semantic_weight * entry[1]
+    
+    combined = [(doc_id, fused(entry)) for doc_id, entry in scores.items()]
+    if top_k is None:
+        return sorted(combined, key=lambda x: x[1], reverse=True)
+    return heapq.nlargest(top_k, combined, key=lambda x: x[1])
+
+
+# Query log lines are appended by one background thread so searches never wait on file I/O
+LOG_FLUSH_SIZE = 64
+LOG_FLUSH_INTERVAL = 0.5  # seconds
+_log_queue = queue.SimpleQueue()
+_log_thread: Optional[threading.Thread] = None
+_log_thread_lock = threading.Lock()
+
+
+def _write_log_lines(pending: Dict[str, List[bytes]]) -> None:
+    for log_file, lines in pending.items():
+        try:
+            with open(log_file, "ab") as f:
+                f.write(b"".join(lines))
+        except OSError as e:
+            print(f"Query log write failed for {log_file}: {e}")
+    pending.clear()
+
+
+def _query_log_worker() -> None:
+    # Batch lines per log file; write every LOG_FLUSH_SIZE entries or LOG_FLUSH_INTERVAL seconds
+    pending: Dict[str, List[bytes]] = defaultdict(list)
+    count = 0
+    deadline = 0.0
+    while True:
+        timeout = max(0.0, deadline - time.monotonic()) if count else None
+        try:
+            item = _log_queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+        
+        if isinstance(item, threading.Event):
+            # flush_query_log() is waiting for everything queued before it
+            _write_log_lines(pending)
+            count = 0
+            item.set()
+            continue
+        
+        if item is not None:
+            log_file, line = item
+            pending[log_file].append(line)
+            count += 1
+            if count == 1:
+                deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        
+        if count and (count >= LOG_FLUSH_SIZE or time.monotonic() >= deadline):
+            _write_log_lines(pending)
+            count = 0
+
+
+def _ensure_log_thread() -> None:
+    global _log_thread
+    if _log_thread is not None:
+        return
+    with _log_thread_lock:
+        if _log_thread is None:
+            thread = threading.Thread(target=_query_log_worker, name="query-log", daemon=True)
+            thread.start()
+            atexit.register(flush_query_log)
+            _log_thread = thread
+
+
+def flush_query_log() -> None:
+    """Block until every queued query log entry has been written."""
+    if _log_thread is None:
+        return
+    done = threading.Event()
+    _log_queue.put(done)
+    done.wait()
+
+
 def log_query(query: str, mode: str, results: List[Tuple[str, float]], 
               log_file: str = "query_log.jsonl") -> None:
     """
     Log query and results to a file.
     
+    The entry is queued and appended by a background thread; call
+    flush_query_log() to wait for it to reach the file.
+    
     Args:
         query: Search query
         mode: Search mode used
@@ -238,51 +609,116 @@ def log_query(query: str, mode: str, results: List[Tuple[str, float]],
         "top_docs": [doc_id for doc_id, _ in results[:5]]   # Top 5 document IDs
     }
     
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(json.dumps(log_entry) + "\n")
+    _ensure_log_thread()
+    _log_queue.put((log_file, _dumps(log_entry) + b"\n"))
+
+
+# Leading log bytes hashed into the stats sidecar to recognise the same log file
+LOG_IDENTITY_BYTES = 4096
+
+
+def _empty_log_stats() -> Dict[str, Any]:
+    return {"offset": 0, "total_queries": 0, "query_counts": {}, "modes": {},
+            "score_count": 0, "score_sum": 0.0, "score_min": None, "score_max": None}
+
+
+def _log_identity(log, length: int) -> Dict[str, Any]:
+    # Device/inode of the open log plus a digest of its first bytes (at most `length`,
+    # the part already aggregated), so a rotated or rewritten log is not mistaken for it
+    st = os.fstat(log.fileno())
+    log.seek(0)
+    head = log.read(min(LOG_IDENTITY_BYTES, length))
+    return {"dev": st.st_dev, "ino": st.st_ino, "head": hashlib.sha1(head).hexdigest()}
+
+
+def _load_log_stats(stats_path: Path, log) -> Dict[str, Any]:
+    # Saved aggregates, unless missing, unreadable, or for a different/truncated log
+    try:
+        with open(stats_path, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        offset = stats["offset"]
+        if (0 <= offset <= os.fstat(log.fileno()).st_size
+                and stats["identity"] == _log_identity(log, offset)):
+            return stats
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return _empty_log_stats()
 
 
 def analyze_query_log(log_file: str = "query_log.jsonl") -> Dict[str, Any]:
     """
     Analyze query log statistics.
     
+    Aggregates are kept in a <log>.stats.json sidecar together with the
+    byte offset they cover and the log's identity; since the log is
+    append-only, each call only parses lines added since the previous one.
+    A rotated, truncated or replaced log is re-read from the start.
+    
     Args:
         log_file: Log file path
     
     Returns:
         Dictionary with analysis results
     """
-    if not Path(log_file).exists():
-        return {"error": "Log file not found"}
+    # Include entries still queued by log_query
+    flush_query_log()
     
-    queries = []
-    modes = defaultdict(int)
-    scores = []
+    log_path = Path(log_file)
+    if not log_path.exists():
+        return {"error": "Log file not found"}
     
-    with open(log_file, "r", encoding="utf-8") as f:
+    stats_path = log_path.with_name(log_path.name + ".stats.json")
+    with open(log_path, "rb") as f:
+        stats = _load_log_stats(stats_path, f)
+        start = stats["offset"]
+        query_counts = stats["query_counts"]
+        modes = stats["modes"]
+        
+        f.seek(start)
         for line in f:
-            entry = json.loads(line)
-            queries.append(entry["query"])
-            modes[entry["mode"]] += 1
-            scores.extend(entry["top_scores"])
+            if not line.endswith(b"\n"):
+                break  # entry still being written
+            stats["offset"] += len(line)
+            entry = _loads(line)
+            stats["total_queries"] += 1
+            query_counts[entry["query"]] = query_counts.get(entry["query"], 0) + 1
+            modes[entry["mode"]] = modes.get(entry["mode"], 0) + 1
+            scores = entry["top_scores"]
+            if scores:
+                stats["score_count"] += len(scores)
+                stats["score_sum"] += sum(scores)
+                low, high = min(scores), max(scores)
+                stats["score_min"] = low if stats["score_min"] is None else min(stats["score_min"], low)
+                stats["score_max"] = high if stats["score_max"] is None else max(stats["score_max"], high)
+        
+        if stats["offset"] != start:
+            stats["identity"] = _log_identity(f, stats["offset"])
+    
+    if stats["offset"] != start:
+        tmp_path = stats_path.with_name(f"{stats_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, stats_path)
+        except OSError as e:
+            print(f"Could not save query log stats to {stats_path}: {e}")
     
     # Find most common queries
-    query_counts = defaultdict(int)
-    for query in queries:
-        query_counts[query] += 1
-    
     most_common = sorted(query_counts.items(), key=lambda x: x[1], reverse=True)[:10]
     
+    score_count = stats["score_count"]
+    average = stats["score_sum"] / score_count if score_count else 0
+    
     return {
-        "total_queries": len(queries),
-        "unique_queries": len(set(queries)),
+        "total_queries": stats["total_queries"],
+        "unique_queries": len(query_counts),
         "mode_usage": dict(modes),
         "most_common_queries": most_common,
-        "average_top_score": sum(scores) / len(scores) if scores else 0,
+        "average_top_score": average,
         "score_distribution": {
-            "min": min(scores) if scores else 0,
-            "max": max(scores) if scores else 0,
-            "avg": sum(scores) / len(scores) if scores else 0
+            "min": stats["score_min"] if score_count else 0,
+            "max": stats["score_max"] if score_count else 0,
+            "avg": average
         }
     }
 
@@ -4,17 +4,18 @@ import sys
 import os
 from pathlib import Path
 
-def run_command(cmd, description):
-    # Run a command and handle errors
+def run_command(argv, description):
+    # Run a command (argv list, no shell) and handle errors.
+    # Output goes straight to the terminal so long installs show progress.
     print(f"\n{description}")
     try:
-        result = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
+        subprocess.run(argv, check=True)
         print(f"{description} completed successfully")
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"{description} failed:")
-        print(f"   Command: {cmd}")
-        print(f"   Error: {e.stderr}")
+        print(f"   Command: {subprocess.list2cmdline(argv)}")
+        print(f"   Error: {e}")
         return False
 
 def check_python_version():
@@ -35,7 +36,7 @@ def install_requirements():
         return False
     
     return run_command(
-        f"{sys.executable} -m pip install -r requirements.txt",
+        [sys.executable, "-m", "pip", "install", "-r", "requirements.txt"],
         "Installing Python packages"
     )
 
@@ -95,7 +96,7 @@ def check_data_files():
 def run_pipeline():
     # Run the complete pipeline
     return run_command(
-        f"{sys.executable} run_pipeline.py --build_index",
+        [sys.executable, "run_pipeline.py", "--build_index"],
         "Running complete pipeline (parse → preprocess → build indices)"
     )
 
@@ -10,9 +10,10 @@ from argparse import ArgumentParser
 # Add current directory to path for imports
 sys.path.append(str(Path(__file__).parent))
 
-from embed_tfidf import build_tfidf, save_index, load_texts
+from embed_tfidf import build_tfidf, save_index, iter_texts
 from embed_semantic import build_semantic_index
 from preprocess_patents import process_file, OUTPUT_FILE
+from search_utils import build_token_index
 
 
 def check_data_files():
@@ -39,23 +40,28 @@ def build_tfidf_index():
 
     
     try:
-        # Check if chunks exist, if not create them
-        if not OUTPUT_FILE.exists():
+        # Create chunks unless they are newer than every source file
+        input_files = [Path("./data/processed") / fname for fname in ["grants.jsonl", "applications.jsonl"]]
+        input_files = [f for f in input_files if f.exists()]
+        src_mtime = max((f.stat().st_mtime for f in input_files), default=0)
+        if OUTPUT_FILE.exists() and OUTPUT_FILE.stat().st_mtime >= src_mtime:
+            print("Chunks up-to-date - skipping rebuild")
+        else:
             print("Creating text chunks")
-            with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
-                for fname in ["grants.jsonl", "applications.jsonl"]:
-                    input_file = Path("./data/processed") / fname
-                    if input_file.exists():
-                        print(f"Processing {input_file}")
-                        process_file(input_file, out, mode="chunks")
+            with open(OUTPUT_FILE, "wb") as out:
+                for input_file in input_files:
+                    print(f"Processing {input_file}")
+                    process_file(input_file, out, mode="chunks")
         
-        # Build TF-IDF index
-        ids, texts = load_texts(OUTPUT_FILE)
-        print(f"Loaded {len(texts)} text chunks")
-        
-        vectorizer, matrix = build_tfidf(ids, texts)
+        # Build TF-IDF index, streaming chunk texts straight into the fit
+        ids = []
+        vectorizer, matrix = build_tfidf(ids, iter_texts(OUTPUT_FILE, ids))
+        print(f"Loaded {len(ids)} text chunks")
         save_index(vectorizer, matrix, ids)
         
+        # Keyword token sets for reranking
+        build_token_index()
+        
         print("TF-IDF index built successfully")
         return True
         
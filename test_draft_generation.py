@@ -5,7 +5,7 @@ Test suite for patent draft generation using Ollama.
 
 import pytest
 import asyncio
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from ollama_service import OllamaService, get_ollama_service
 from api_endpoints import DraftRequestModel, DraftResponseModel
 
@@ -102,6 +102,77 @@ class TestOllamaService:
         assert result["generation_time"] > 0
         assert result["cached"] == False
     
+    @patch('ollama_service.ollama')
+    def test_generate_patent_draft_cache_hit(self, mock_ollama):
+        """Test that repeat requests are served from the draft cache."""
+        mock_ollama.generate.return_value = {'response': 'TITLE OF THE INVENTION\nCached Patent'}
+        
+        service = OllamaService()
+        service.client = mock_ollama
+        service.is_available = Mock(return_value=True)
+        service.ensure_model_available = Mock(return_value=True)
+        
+        description = "A neural network system for analyzing medical images that uses convolutional layers."
+        first = service.generate_patent_draft(description, "llama3.2:3b", "utility")
+        second = service.generate_patent_draft(description, "llama3.2:3b", "utility")
+        other_template = service.generate_patent_draft(description, "llama3.2:3b", "software")
+        
+        assert first["cached"] == False
+        assert second["cached"] == True
+        assert second["draft"] == first["draft"]
+        assert second["generation_time"] == 0.0
+        assert other_template["cached"] == False
+        assert mock_ollama.generate.call_count == 2
+    
+    @pytest.mark.asyncio
+    @patch('ollama_service.ollama')
+    async def test_agenerate_patent_draft_concurrent_requests_share_client(self, mock_ollama):
+        """Test that concurrent async draft requests run on one shared client."""
+        service = OllamaService()
+        service.is_available = Mock(return_value=True)
+        service.ensure_model_available = Mock(return_value=True)
+        
+        async def fake_generate(client, prompt, model):
+            return {"draft": f"Draft for {model}", "generation_time": 0.1}
+        service._agenerate = Mock(side_effect=fake_generate)
+        
+        descriptions = [
+            f"A neural network system number {i} for analyzing medical images using convolutional layers."
+            for i in range(3)
+        ]
+        results = await asyncio.gather(
+            *[service.agenerate_patent_draft(d, "llama3.2:3b", "utility") for d in descriptions]
+        )
+        
+        assert [r["draft"] for r in results] == ["Draft for llama3.2:3b"] * 3
+        assert all(r["cached"] == False for r in results)
+        assert service._agenerate.call_count == 3
+        assert mock_ollama.AsyncClient.call_count == 1
+    
+    @pytest.mark.asyncio
+    @patch('ollama_service.ollama')
+    async def test_generate_patent_drafts_batch_reports_failed_items(self, mock_ollama):
+        """Test that one failed generation yields an error entry without losing the others."""
+        service = OllamaService()
+        service.is_available = Mock(return_value=True)
+        service.ensure_model_available = Mock(return_value=True)
+        
+        async def fake_generate(client, prompt, model):
+            if "number 1" in prompt:
+                raise ConnectionError("connection reset")
+            return {"draft": "Draft", "generation_time": 0.1}
+        service._agenerate = Mock(side_effect=fake_generate)
+        
+        descriptions = [
+            f"A neural network system number {i} for analyzing medical images using convolutional layers."
+            for i in range(3)
+        ]
+        results = await service.generate_patent_drafts_batch(descriptions, "llama3.2:3b", use_cache=False)
+        
+        assert [r["draft"] for r in results] == ["Draft", None, "Draft"]
+        assert "connection reset" in results[1]["error"]
+        assert "error" not in results[0]
+    
     @patch('ollama_service.ollama')
     def test_generate_patent_draft_ollama_unavailable(self, mock_ollama):
         """Test patent draft generation when Ollama is unavailable."""
@@ -109,7 +180,18 @@ class TestOllamaService:
         service.is_available = Mock(return_value=False)
         
         with pytest.raises(RuntimeError, match="Ollama is not available"):
+            service.generate_patent_draft(
+                "A neural network system for analyzing medical images that uses convolutional layers."
+            )
+    
+    def test_generate_patent_draft_invalid_description_skips_ollama(self):
+        """Test that invalid descriptions are rejected before contacting Ollama."""
+        service = OllamaService()
+        service.is_available = Mock(return_value=True)
+        
+        with pytest.raises(ValueError, match="Description too short"):
             service.generate_patent_draft("Test description")
+        service.is_available.assert_not_called()
     
     def test_get_available_models(self):
         """Test getting available models."""
@@ -199,13 +281,13 @@ class TestIntegration:
         with patch('api_endpoints.get_ollama_service') as mock_service:
             mock_ollama_service = Mock()
             mock_ollama_service.is_available.return_value = True
-            mock_ollama_service.generate_patent_draft.return_value = {
+            mock_ollama_service.agenerate_patent_draft = AsyncMock(return_value={
                 "draft": "TITLE OF THE INVENTION\nTest Patent\n\nFIELD OF THE INVENTION\nThis invention relates to...",
                 "model": "llama3.2:3b",
                 "template_type": "utility",
                 "generation_time": 1.5,
                 "cached": False
-            }
+            })
             mock_service.return_value = mock_ollama_service
             
             response = client.post("/api/v1/generate_draft", json={
@@ -247,6 +329,35 @@ class TestIntegration:
             data = response.json()
             assert "Ollama service is not available" in data["detail"]
     
+    @pytest.mark.asyncio
+    async def test_generate_draft_stream_endpoint_not_compressed(self):
+        """Test that streamed drafts skip response compression."""
+        from fastapi.testclient import TestClient
+        from main import app
+        
+        client = TestClient(app)
+        chunks = [b"CLAIMS\n" * 200, b"1. A system comprising a processor.\n" * 50]
+        
+        async def fake_stream(**kwargs):
+            for chunk in chunks:
+                yield chunk
+        
+        with patch('api_endpoints.get_ollama_service') as mock_service:
+            mock_ollama_service = Mock()
+            mock_ollama_service.is_available.return_value = True
+            mock_ollama_service.agenerate_draft_stream = fake_stream
+            mock_service.return_value = mock_ollama_service
+            
+            response = client.post("/api/v1/generate_draft/stream", json={
+                "description": "A neural network system for analyzing medical images that uses convolutional layers to detect anomalies in X-ray scans.",
+                "model": "llama3.2:3b",
+                "template_type": "utility"
+            }, headers={"Accept-Encoding": "gzip, br"})
+            
+            assert response.status_code == 200
+            assert "content-encoding" not in response.headers
+            assert response.content == b"".join(chunks)
+    
     @pytest.mark.asyncio
     async def test_ollama_health_endpoint(self):
         """Test Ollama health check endpoint."""
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Parametrized per-case validation tests for the Patent NLP API.
+Needs a running server; see error_handling_test.py for the full suite:
+    pytest test_error_handling.py -n auto
+"""
+
+import pytest
+
+from error_handling_test import (
+    INVALID_TOP_K_BODIES, INVALID_ALPHA_BODIES, MISSING_FIELDS_BODIES, MISSING_FIELDS_IDS,
+    check_top_k_case, check_alpha_case, check_missing_fields_case
+)
+
+
+@pytest.mark.parametrize("top_k,body,expected", INVALID_TOP_K_BODIES,
+                         ids=[str(case[0]) for case in INVALID_TOP_K_BODIES])
+def test_top_k_case(top_k, body, expected):
+    """Each invalid top_k value is rejected."""
+    check_top_k_case(top_k, body, expected)
+
+
+@pytest.mark.parametrize("alpha,body,expected", INVALID_ALPHA_BODIES,
+                         ids=[str(case[0]) for case in INVALID_ALPHA_BODIES])
+def test_alpha_case(alpha, body, expected):
+    """Each invalid alpha value is rejected."""
+    check_alpha_case(alpha, body, expected)
+
+
+@pytest.mark.parametrize("body,expected", MISSING_FIELDS_BODIES, ids=MISSING_FIELDS_IDS)
+def test_missing_fields_case(body, expected):
+    """Missing required fields are rejected; defaults fill the rest."""
+    check_missing_fields_case(body, expected)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Unit tests for parse_patents record splitting and metadata extraction.
+"""
+
+import pytest
+
+from parse_patents import extract_metadata, parse_record, split_records
+
+
+RECORD = """<us-patent-grant lang="EN">
+<us-bibliographic-data-grant>
+<publication-reference>
+<document-id><country>US</country><doc-number>12345678</doc-number><kind>B2</kind></document-id>
+</publication-reference>
+<application-reference>
+<document-id><country>US</country><doc-number>99999999</doc-number><kind>A1</kind></document-id>
+</application-reference>
+<invention-title id="title">Neural network accelerator</invention-title>
+</us-bibliographic-data-grant>
+<abstract><p>An accelerator</p><p>for networks.</p></abstract>
+<claims><claim><claim-text>1. A chip.</claim-text></claim></claims>
+<description><p>Detailed description.</p></description>
+</us-patent-grant>
+"""
+
+
+def _write(tmp_path, text):
+    path = tmp_path / "grants.xml"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+class TestSplitRecords:
+    """Tests for splitting concatenated XML documents into records."""
+    
+    def test_concatenated_documents(self, tmp_path):
+        """Test that each record is cut from its start tag to its end tag, skipping preambles."""
+        preamble = '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE us-patent-grant SYSTEM "grant.dtd" [ ]>\n'
+        path = _write(tmp_path, preamble + RECORD + preamble + RECORD.replace("12345678", "87654321"))
+        
+        records = list(split_records(path, "us-patent-grant"))
+        
+        assert len(records) == 2
+        assert all(r.startswith("<us-patent-grant") and r.endswith("</us-patent-grant>") for r in records)
+        assert "87654321" in records[1]
+    
+    def test_records_on_one_line(self, tmp_path):
+        """Test that records sharing a line are still split apart."""
+        path = _write(tmp_path, "<r><a>1</a></r><r><a>2</a></r>\n")
+        assert list(split_records(path, "r")) == ["<r><a>1</a></r>", "<r><a>2</a></r>"]
+    
+    def test_unterminated_record_is_dropped(self, tmp_path):
+        """Test that a truncated final record is not yielded."""
+        path = _write(tmp_path, "<r>1</r>\n<r>2")
+        assert list(split_records(path, "r")) == ["<r>1</r>"]
+    
+    def test_empty_file(self, tmp_path):
+        """Test that an empty file yields nothing."""
+        assert list(split_records(_write(tmp_path, ""), "r")) == []
+
+
+class TestExtractMetadata:
+    """Tests for single-pass metadata extraction."""
+    
+    def test_full_record(self):
+        """Test that every field is extracted, using the publication (not application) reference."""
+        data = parse_record(RECORD, "us-patent-grant")
+        assert data == {
+            "doc_id": "US12345678B2",
+            "title": "Neural network accelerator",
+            "abstract": "An accelerator for networks.",
+            "claims": "1. A chip.",
+            "description": "Detailed description.",
+        }
+    
+    def test_missing_fields_are_empty(self):
+        """Test that absent elements give empty strings."""
+        data = parse_record("<us-patent-grant><abstract>Only</abstract></us-patent-grant>", "us-patent-grant")
+        assert data == {"doc_id": "", "title": "", "abstract": "Only", "claims": "", "description": ""}
+    
+    def test_first_occurrence_wins(self):
+        """Test that a repeated element keeps the first occurrence, as find() did."""
+        data = parse_record(
+            "<r><invention-title>First</invention-title><invention-title>Second</invention-title></r>", "r"
+        )
+        assert data["title"] == "First"
+    
+    def test_wrong_root_tag(self):
+        """Test that a record with an unexpected root is skipped."""
+        assert parse_record("<other/>", "us-patent-grant") is None
+    
+    def test_extract_from_element(self):
+        """Test extract_metadata directly on a parsed element."""
+        import xml.etree.ElementTree as ET
+        elem = ET.fromstring("<r><claims><claim>A</claim><claim>B</claim></claims></r>")
+        assert extract_metadata(elem)["claims"] == "A B"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
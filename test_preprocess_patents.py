@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Unit tests for preprocess_patents chunking.
+"""
+
+import pytest
+
+from preprocess_patents import chunk_tokens
+
+
+def _slice_chunks(tokens, chunk_size, overlap):
+    # Reference: the original list-slicing implementation, joined like chunk_tokens
+    start = 0
+    while start < len(tokens):
+        end = min(start + chunk_size, len(tokens))
+        yield " ".join(tokens[start:end])
+        if end == len(tokens):
+            break
+        start = end - overlap
+
+
+class TestChunkTokens:
+    """Tests for the streaming overlapping-window chunker."""
+    
+    @pytest.mark.parametrize("length", [0, 1, 3, 4, 5, 7, 8, 10, 11])
+    def test_matches_slicing(self, length):
+        """Test that chunk boundaries match the original slicing at every remainder."""
+        tokens = [f"t{i}" for i in range(length)]
+        assert list(chunk_tokens(tokens, chunk_size=4, overlap=1)) == list(_slice_chunks(tokens, 4, 1))
+    
+    def test_windows(self):
+        """Test the exact windows, including a short final chunk."""
+        tokens = [str(i) for i in range(8)]
+        assert list(chunk_tokens(tokens, chunk_size=4, overlap=1)) == ["0 1 2 3", "3 4 5 6", "6 7"]
+    
+    def test_no_trailing_duplicate(self):
+        """Test that a chunk ending exactly at the last token is not followed by an overlap-only chunk."""
+        tokens = [str(i) for i in range(7)]
+        assert list(chunk_tokens(tokens, chunk_size=4, overlap=1)) == ["0 1 2 3", "3 4 5 6"]
+    
+    def test_accepts_iterator(self):
+        """Test that tokens can come from a generator."""
+        tokens = (str(i) for i in range(5))
+        assert list(chunk_tokens(tokens, chunk_size=3, overlap=0)) == ["0 1 2", "3 4"]
+    
+    def test_empty_input(self):
+        """Test that no tokens give no chunks."""
+        assert list(chunk_tokens([], chunk_size=4, overlap=1)) == []
+    
+    def test_overlap_not_smaller_than_chunk_size(self):
+        """Test that an overlap >= chunk_size still advances one token per chunk."""
+        assert list(chunk_tokens(["a", "b", "c"], chunk_size=2, overlap=2)) == ["a b", "b c"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the search service result caches.
+"""
+
+import numpy as np
+import pytest
+from cachetools import LRUCache
+from unittest.mock import Mock, patch
+
+import search_service
+from search_service import SearchRequest, SearchResult, run_search
+
+
+@pytest.fixture
+def fresh_caches():
+    """Empty result caches and a fixed query embedding, so every query is a paraphrase."""
+    embedding = np.ones((1, 4), dtype=np.float32) / 2.0
+    with patch.object(search_service, "_result_cache", LRUCache(maxsize=8)), \
+         patch.object(search_service, "_semantic_result_cache",
+                      search_service._SemanticResultCache(8, 0.95)), \
+         patch.object(search_service, "OPTIMIZED_AVAILABLE", True), \
+         patch.object(search_service, "embed_query", Mock(return_value=embedding), create=True) as mock_embed, \
+         patch.object(search_service, "_execute_search",
+                      Mock(return_value=[SearchResult("US1_chunk0", 0.9)])) as mock_execute:
+        yield mock_embed, mock_execute
+
+
+class TestParaphraseCache:
+    """Tests for the embedding-similarity (paraphrase) result cache."""
+    
+    def test_semantic_paraphrase_reuses_results(self, fresh_caches):
+        """Test that a paraphrased semantic query is served from the paraphrase cache."""
+        mock_embed, mock_execute = fresh_caches
+        
+        run_search(SearchRequest("neural network", mode="semantic", include_snippets=False))
+        results, _ = run_search(SearchRequest("neural networks", mode="semantic", include_snippets=False))
+        
+        assert [r.doc_id for r in results] == ["US1_chunk0"]
+        assert mock_execute.call_count == 1
+        assert mock_embed.call_count == 2
+    
+    def test_rerank_skips_paraphrase_cache(self, fresh_caches):
+        """Test that reranked semantic queries neither read nor fill the paraphrase cache."""
+        mock_embed, mock_execute = fresh_caches
+        
+        run_search(SearchRequest("neural network", mode="semantic", rerank=True, include_snippets=False))
+        run_search(SearchRequest("neural networks", mode="semantic", rerank=True, include_snippets=False))
+        
+        assert mock_execute.call_count == 2
+        assert mock_embed.call_count == 0
+    
+    def test_hybrid_skips_paraphrase_cache(self, fresh_caches):
+        """Test that hybrid queries never consult the paraphrase cache."""
+        mock_embed, mock_execute = fresh_caches
+        
+        run_search(SearchRequest("neural network", mode="hybrid", include_snippets=False))
+        run_search(SearchRequest("neural networks", mode="hybrid", include_snippets=False))
+        
+        assert mock_execute.call_count == 2
+        assert mock_embed.call_count == 0
+    
+    def test_exact_repeat_is_cached_with_rerank(self, fresh_caches):
+        """Test that rerank still uses the exact-match result cache."""
+        mock_embed, mock_execute = fresh_caches
+        
+        run_search(SearchRequest("Neural  Network", mode="semantic", rerank=True, include_snippets=False))
+        run_search(SearchRequest("neural network", mode="semantic", rerank=True, include_snippets=False))
+        
+        assert mock_execute.call_count == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
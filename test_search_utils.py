@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Unit tests for search_utils: snippets, score fusion, chunk text lookup and
+incremental query log analysis.
+"""
+
+import json
+import os
+
+import pytest
+
+import search_utils
+from search_utils import analyze_query_log, fuse_scores, generate_snippet, get_chunk_texts
+
+
+class TestGenerateSnippet:
+    """Tests for snippet window selection and highlighting."""
+    
+    def test_empty_text(self):
+        """Test that empty text gives an empty snippet."""
+        assert generate_snippet("", "neural network") == ""
+    
+    def test_empty_query_truncates(self):
+        """Test that without a query the text is cut at max_length."""
+        text = "a" * 250
+        assert generate_snippet(text, "") == "a" * 200 + "..."
+        assert generate_snippet("short text", "") == "short text"
+    
+    def test_short_terms_are_ignored(self):
+        """Test that query terms of two characters or fewer are not highlighted."""
+        assert generate_snippet("an AI system", "an ai") == "an AI system"
+    
+    def test_highlights_whole_words_only(self):
+        """Test that terms only match whole words, not substrings of longer words."""
+        snippet = generate_snippet("A network of networks on the internet.", "network net")
+        assert snippet == "A **network** of networks on the internet."
+    
+    def test_highlight_keeps_original_case(self):
+        """Test that highlighted terms keep their case in the text."""
+        snippet = generate_snippet("Neural NETWORK training", "neural network")
+        assert snippet == "**Neural** **NETWORK** training"
+    
+    def test_query_split_into_word_terms(self):
+        """Test that punctuation in the query separates terms."""
+        snippet = generate_snippet("a machine-learning model", "machine-learning")
+        assert snippet == "a **machine**-**learning** model"
+    
+    def test_window_starts_at_densest_hits(self):
+        """Test that the window starts at the hit with the most hits after it."""
+        text = "sensor " + "x" * 300 + " sensor array sensor array sensor " + "y" * 300
+        snippet = generate_snippet(text, "sensor array", max_length=50)
+        assert snippet.startswith("...**sensor** **array** **sensor**")
+        assert snippet.endswith("...")
+    
+    def test_window_near_end_is_kept_full_length(self):
+        """Test that a hit near the end moves the window back to fill max_length."""
+        text = "z" * 300 + " sensor"
+        snippet = generate_snippet(text, "sensor", max_length=50)
+        assert snippet.startswith("...")
+        assert snippet.endswith("**sensor**")
+        assert not snippet.endswith("...")
+        assert len(snippet) == len("...") + 50 + len("****")
+    
+    def test_no_hits_starts_at_beginning(self):
+        """Test that a query with no hits shows the start of the text."""
+        text = "b" * 250
+        assert generate_snippet(text, "sensor") == "b" * 200 + "..."
+
+
+class TestFuseScores:
+    """Tests for CombSUM and CombMNZ fusion."""
+    
+    TFIDF = [("a", 1.0), ("b", 0.5)]
+    SEMANTIC = [("b", 1.0), ("c", 0.8)]
+    
+    def test_combsum(self):
+        """Test weighted sums, with 0 for a list that missed the doc."""
+        fused = fuse_scores(self.TFIDF, self.SEMANTIC, tfidf_weight=0.5, semantic_weight=0.5)
+        assert [doc_id for doc_id, _ in fused] == ["b", "a", "c"]
+        assert dict(fused) == pytest.approx({"a": 0.5, "b": 0.75, "c": 0.4})
+    
+    def test_combmnz_boosts_docs_found_by_both(self):
+        """Test that CombMNZ multiplies by the number of lists that found the doc."""
+        fused = fuse_scores(self.TFIDF, self.SEMANTIC, tfidf_weight=0.5, semantic_weight=0.5,
+                            method="combmnz")
+        assert dict(fused) == pytest.approx({"a": 0.5, "b": 1.5, "c": 0.4})
+    
+    def test_combmnz_disjoint_lists_match_combsum(self):
+        """Test that with no shared docs CombMNZ equals CombSUM."""
+        tfidf, semantic = [("a", 0.9), ("b", 0.3)], [("c", 0.6), ("d", 0.2)]
+        combsum = fuse_scores(tfidf, semantic, tfidf_weight=0.3, semantic_weight=0.7)
+        combmnz = fuse_scores(tfidf, semantic, tfidf_weight=0.3, semantic_weight=0.7, method="combmnz")
+        assert combmnz == combsum
+    
+    def test_top_k(self):
+        """Test that top_k keeps only the best fused docs, best first."""
+        fused = fuse_scores(self.TFIDF, self.SEMANTIC, tfidf_weight=0.5, semantic_weight=0.5, top_k=2)
+        assert [doc_id for doc_id, _ in fused] == ["b", "a"]
+    
+    def test_empty_inputs(self):
+        """Test that two empty lists fuse to an empty list."""
+        assert fuse_scores([], [], tfidf_weight=0.5, semantic_weight=0.5) == []
+    
+    def test_invalid_method(self):
+        """Test that an unknown fusion method is rejected."""
+        with pytest.raises(ValueError, match="Invalid fusion method"):
+            fuse_scores(self.TFIDF, self.SEMANTIC, tfidf_weight=0.5, semantic_weight=0.5, method="rrf")
+
+
+@pytest.fixture
+def chunks_file(tmp_path, monkeypatch):
+    """A chunks.jsonl in a temp dir, with the offset index cache reset."""
+    path = tmp_path / "chunks.jsonl"
+    monkeypatch.setattr(search_utils, "CHUNKS_FILE", path)
+    monkeypatch.setattr(search_utils, "CHUNK_INDEX_FILE", tmp_path / "chunks.idx.pkl")
+    monkeypatch.setattr(search_utils, "_chunk_index", None)
+    monkeypatch.setattr(search_utils, "_chunk_index_key", None)
+    return path
+
+
+def _write_chunks(path, chunks):
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk) + "\n")
+
+
+class TestGetChunkTexts:
+    """Tests for chunk text lookup through the byte-offset index."""
+    
+    def test_lookup(self, chunks_file):
+        """Test that texts are found by id, and unknown ids map to None."""
+        _write_chunks(chunks_file, [
+            {"doc_id": "US1", "chunk_id": "US1_chunk0", "text": "first"},
+            {"doc_id": "US1", "chunk_id": "US1_chunk1", "text": "second"},
+            {"doc_id": "US2", "chunk_id": "US2_chunk0", "text": "third"},
+        ])
+        texts = get_chunk_texts(["US2_chunk0", "missing", "US1_chunk1"])
+        assert texts == {"US2_chunk0": "third", "missing": None, "US1_chunk1": "second"}
+        assert search_utils.CHUNK_INDEX_FILE.exists()
+    
+    def test_escaped_chunk_id(self, chunks_file):
+        """Test that ids the fast regex can't read are indexed by a full parse."""
+        _write_chunks(chunks_file, [
+            {"chunk_id": 'US"3"_chunk0', "text": "quoted"},
+            {"chunk_id": "US4_chunk0", "text": "plain"},
+        ])
+        assert get_chunk_texts(['US"3"_chunk0', "US4_chunk0"]) == {
+            'US"3"_chunk0': "quoted", "US4_chunk0": "plain"
+        }
+    
+    def test_missing_file(self, chunks_file):
+        """Test that every id maps to None without a chunks file."""
+        assert get_chunk_texts(["US1_chunk0"]) == {"US1_chunk0": None}
+    
+    def test_index_follows_rewritten_file(self, chunks_file):
+        """Test that a changed chunks file is re-indexed instead of served from the stale index."""
+        _write_chunks(chunks_file, [{"chunk_id": "US1_chunk0", "text": "old"}])
+        assert get_chunk_texts(["US1_chunk0"]) == {"US1_chunk0": "old"}
+        
+        _write_chunks(chunks_file, [
+            {"chunk_id": "US0_chunk0", "text": "inserted"},
+            {"chunk_id": "US1_chunk0", "text": "new"},
+        ])
+        assert get_chunk_texts(["US1_chunk0", "US0_chunk0"]) == {
+            "US1_chunk0": "new", "US0_chunk0": "inserted"
+        }
+
+
+def _log_line(query, mode="semantic", scores=(0.5,)):
+    entry = {"timestamp": "2025-01-01T00:00:00", "query": query, "mode": mode,
+             "num_results": len(scores), "top_scores": list(scores), "top_docs": []}
+    return json.dumps(entry) + "\n"
+
+
+class TestAnalyzeQueryLog:
+    """Tests for incremental query log analysis and its stats sidecar."""
+    
+    def test_missing_log(self, tmp_path):
+        """Test that a missing log reports an error."""
+        assert analyze_query_log(str(tmp_path / "none.jsonl")) == {"error": "Log file not found"}
+    
+    def test_aggregates(self, tmp_path):
+        """Test counts, mode usage and score distribution."""
+        log = tmp_path / "query_log.jsonl"
+        log.write_text(_log_line("a", scores=(0.2, 0.8)) + _log_line("b", "tfidf", ()) + _log_line("a"))
+        
+        analysis = analyze_query_log(str(log))
+        
+        assert analysis["total_queries"] == 3
+        assert analysis["unique_queries"] == 2
+        assert analysis["mode_usage"] == {"semantic": 2, "tfidf": 1}
+        assert analysis["most_common_queries"][0] == ("a", 2)
+        assert analysis["score_distribution"] == pytest.approx({"min": 0.2, "max": 0.8, "avg": 0.5})
+    
+    def test_resumes_from_sidecar(self, tmp_path):
+        """Test that a second call only reads lines appended since the first."""
+        log = tmp_path / "query_log.jsonl"
+        log.write_text(_log_line("a"))
+        analyze_query_log(str(log))
+        
+        # Inflate the saved count: a resumed read keeps it, a full re-read would not
+        stats_path = tmp_path / "query_log.jsonl.stats.json"
+        stats = json.loads(stats_path.read_text())
+        assert stats["offset"] == log.stat().st_size
+        stats["total_queries"] = 100
+        stats_path.write_text(json.dumps(stats))
+        
+        with open(log, "a") as f:
+            f.write(_log_line("b"))
+        assert analyze_query_log(str(log))["total_queries"] == 101
+    
+    def test_partial_line_waits(self, tmp_path):
+        """Test that an unterminated last line is counted only once complete."""
+        log = tmp_path / "query_log.jsonl"
+        line = _log_line("b")
+        log.write_text(_log_line("a") + line[:10])
+        assert analyze_query_log(str(log))["total_queries"] == 1
+        
+        with open(log, "a") as f:
+            f.write(line[10:])
+        assert analyze_query_log(str(log))["total_queries"] == 2
+    
+    def test_replaced_log_is_recounted(self, tmp_path):
+        """Test that a log replaced by a larger file is read from the start."""
+        log = tmp_path / "query_log.jsonl"
+        log.write_text(_log_line("a"))
+        analyze_query_log(str(log))
+        
+        rotated = tmp_path / "new.jsonl"
+        rotated.write_text(_log_line("x") + _log_line("y") + _log_line("z"))
+        os.replace(rotated, log)
+        
+        analysis = analyze_query_log(str(log))
+        assert analysis["total_queries"] == 3
+        assert "a" not in dict(analysis["most_common_queries"])
+    
+    def test_truncated_and_regrown_log_is_recounted(self, tmp_path):
+        """Test that a log rewritten in place with different content is read from the start."""
+        log = tmp_path / "query_log.jsonl"
+        log.write_text(_log_line("a"))
+        analyze_query_log(str(log))
+        
+        with open(log, "w") as f:
+            f.write(_log_line("x") + _log_line("y"))
+        
+        analysis = analyze_query_log(str(log))
+        assert analysis["total_queries"] == 2
+        assert dict(analysis["most_common_queries"]) == {"x": 1, "y": 1}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])